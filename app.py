@@ -1,8 +1,9 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-from sqlalchemy import create_engine, text
-from supabase import create_client, Client
 
 # =========================
 # ⚙️ Configuración general
@@ -12,57 +13,145 @@ st.set_page_config(page_title="Sistema Hogwarts", page_icon="🏆", layout="wide
 if "initialized" not in st.session_state:
     st.session_state.initialized = True
 
+# Las dependencias pesadas (pandas, matplotlib, sqlalchemy, supabase) se
+# importan solo cuando la sección que las usa se renderiza, para que el
+# login aparezca sin esperar a que carguen.
+
 # =========================
 # 🔗 Conexión a Supabase Postgres
 # =========================
-DB_USER = st.secrets["DB_USER"]
-DB_PASS = st.secrets["DB_PASS"]
-DB_HOST = st.secrets["DB_HOST"]
-DB_PORT = st.secrets["DB_PORT"]
-DB_NAME = st.secrets["DB_NAME"]
-
-engine = create_engine(
-    f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
-    pool_pre_ping=True
-)
+@st.cache_resource
+def get_engine():
+    from sqlalchemy import create_engine
+    return create_engine(
+        f"postgresql://{st.secrets['DB_USER']}:{st.secrets['DB_PASS']}@{st.secrets['DB_HOST']}:{st.secrets['DB_PORT']}/{st.secrets['DB_NAME']}",
+        pool_pre_ping=True
+    )
 
 # =========================
 # 🔑 Autenticación Supabase
 # =========================
-url: str = st.secrets["SUPABASE_URL"]
-key: str = st.secrets["SUPABASE_KEY"]
-supabase: Client = create_client(url, key)
-
-# =========================
-# 📌 Utilidades
-# =========================
-def clear_all_caches():
-    st.cache_data.clear()
-
-def get_profesor(email):
-    with engine.connect() as conn:
-        query = text("""
-            SELECT 
-                id, rol, fraternidad_id, colegio_id, 
-                (nombres || ' ' || apellidos) as nombre_completo,
-                asignatura, area, grados
-            FROM profesores
-            WHERE email = :email
-        """)
-        row = conn.execute(query, {"email": email}).fetchone()
-        return row
+def nuevo_supabase():
+    # Sin renovación automática ni almacenamiento propio: los tokens solo los
+    # rota mantener_sesion, que es quien reescribe la cookie. Un temporizador
+    # del cliente gastaría el refresh token a espaldas de la app.
+    from supabase import ClientOptions, create_client
+    return create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"],
+                         options=ClientOptions(auto_refresh_token=False, persist_session=False))
+
+def get_supabase():
+    # Un cliente por sesión: el cliente guarda el estado de auth del usuario,
+    # así que no se comparte entre sesiones con st.cache_resource.
+    if "supabase" not in st.session_state:
+        st.session_state["supabase"] = nuevo_supabase()
+    return st.session_state["supabase"]
+
+@st.cache_resource
+def get_verificador():
+    # None si los secrets no traen la clave de firma: sin sesiones persistentes.
+    from sesion import VerificadorTokens
+    return VerificadorTokens.desde_secrets(st.secrets)
+
+@st.cache_resource
+def get_almacen():
+    # Refresh tokens de todas las sesiones: la cookie solo lleva el access token.
+    from sesion import AlmacenRefresco
+    return AlmacenRefresco()
+
+@st.cache_resource
+def get_refrescos():
+    # Hilos compartidos por todas las sesiones para renovar tokens.
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="refresco-sesion")
+
+def escribir_cookie(valor: str, max_edad_s: int):
+    # Secure siempre: los navegadores la aceptan también en http://localhost.
+    from sesion import COOKIE
+    cookie = f"{COOKIE}={valor}; Max-Age={max_edad_s}; Path=/; SameSite=Strict; Secure"
+    st.html(f"<script>document.cookie = {json.dumps(cookie)};</script>", unsafe_allow_javascript=True)
+
+def guardar_sesion(sesion):
+    anterior = st.session_state.get("sesion")
+    if anterior is not None and anterior.access_token != sesion.access_token:
+        get_almacen().olvidar(anterior.access_token)
+    if sesion.refresh_token is not None:
+        get_almacen().guardar(sesion)
+    st.session_state["sesion"] = sesion
+    st.session_state["user"] = sesion.usuario
+
+def olvidar_sesion():
+    sesion = st.session_state.get("sesion")
+    if sesion is not None:
+        get_almacen().olvidar(sesion.access_token)
+    escribir_cookie("", 0)
+    st.session_state.clear()
+    # st.context.cookies sigue mostrando la cookie con que se abrió la página.
+    st.session_state["sin_cookie"] = True
+
+def mantener_sesion():
+    sesion = st.session_state.get("sesion")
+    if sesion is None:
+        return
+    from sesion import REFRESCAR_ANTES_S, refrescar
+    futuro = st.session_state.get("refresco")
+    if futuro is not None and (futuro.done() or sesion.restante() <= 0):
+        del st.session_state["refresco"]
+        try:
+            guardar_sesion(futuro.result(timeout=10))
+        except Exception:
+            pass   # se reintenta abajo
+        sesion = st.session_state["sesion"]
+
+    if sesion.restante() <= 0:
+        # Token vencido (pestaña inactiva o página recargada tarde): se renueva ya.
+        # Sin refresh token (el servidor se reinició) la sesión termina aquí.
+        try:
+            guardar_sesion(refrescar(get_supabase(), sesion.refresh_token, get_verificador()))
+        except Exception:
+            olvidar_sesion()
+            st.warning("⏰ Tu sesión expiró. Inicia sesión de nuevo.")
+            st.stop()
+    elif (sesion.restante() < REFRESCAR_ANTES_S and sesion.refresh_token is not None
+          and "refresco" not in st.session_state):
+        st.session_state["refresco"] = get_refrescos().submit(
+            refrescar, get_supabase(), sesion.refresh_token, get_verificador())
+
+    sesion = st.session_state["sesion"]
+    if st.session_state.get("cookie_escrita") != sesion.access_token:
+        escribir_cookie(sesion.cookie(), max(int(sesion.restante()), 0))
+        st.session_state["cookie_escrita"] = sesion.access_token
+
+def nueva_figura(figsize=(6,3)):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt.subplots(figsize=figsize)
 
 # =========================
 # 📌 Login
 # =========================
+# Primero se intenta restaurar la sesión desde la cookie: la firma y la
+# expiración del token se verifican aquí, sin llamar a Supabase.
+if "user" not in st.session_state and not st.session_state.get("sin_cookie"):
+    verificador = get_verificador()
+    if verificador is not None:
+        from sesion import COOKIE
+        restaurada = verificador.desde_cookie(st.context.cookies.get(COOKIE), get_almacen())
+        if restaurada is not None:
+            guardar_sesion(restaurada)
+
 if "user" not in st.session_state:
     st.sidebar.title("Acceso profesores")
     email = st.sidebar.text_input("Correo")
     password = st.sidebar.text_input("Contraseña", type="password")
     if st.sidebar.button("Iniciar sesión", use_container_width=True):
         try:
-            auth_resp = supabase.auth.sign_in_with_password({"email": email, "password": password})
-            st.session_state["user"] = auth_resp.user
+            auth_resp = get_supabase().auth.sign_in_with_password({"email": email, "password": password})
+            verificador = get_verificador()
+            if verificador is not None:
+                guardar_sesion(verificador.sesion(auth_resp.session.access_token,
+                                                  auth_resp.session.refresh_token))
+            else:
+                st.session_state["user"] = auth_resp.user
             st.success(f"✅ Bienvenido {email}")
             st.query_params["refresh"] = "1"
             st.rerun()   # 👈 reinicia la app con usuario ya en sesión
@@ -70,6 +159,85 @@ if "user" not in st.session_state:
             st.error(f"❌ Error: {e}")
     st.stop()
 
+mantener_sesion()
+
+
+# =========================
+# 📦 Dependencias de datos (ya logueado)
+# =========================
+import pandas as pd
+from sqlalchemy import text
+from notificaciones import EscuchaPuntos, notificar_puntos, version_en_base
+
+engine = get_engine()
+
+# =========================
+# 📣 Avisos de cambios (LISTEN/NOTIFY)
+# =========================
+REFRESCO_LEADERBOARD = "5s"
+
+@st.cache_resource
+def get_escucha():
+    # Una sola escucha por proceso, compartida por todas las sesiones.
+    return EscuchaPuntos(get_engine())
+
+def version_datos(colegio_id):
+    return get_escucha().version(colegio_id)
+
+def datos_cambiaron(colegio_id):
+    # Los avisos de este proceso no vuelven a aplicarse al llegar por LISTEN.
+    get_escucha().marcar(colegio_id)
+
+# =========================
+# 💽 Cache compartido en disco (opcional, CACHE_DISCO en secrets)
+# =========================
+# Segundo nivel detrás de st.cache_data: las réplicas del mismo servidor y los
+# procesos recién reiniciados leen de ahí en vez de ir a la base. El resumen
+# se sella con versiones_colegio; valores y fraternidades no pasan por las
+# escrituras de la app, así que solo caducan por edad.
+EDAD_MAX_RESUMEN_S = 3600
+EDAD_MAX_CATALOGOS_S = 600
+
+@st.cache_resource
+def get_cache_disco():
+    ruta = st.secrets.get("CACHE_DISCO")
+    if not ruta:
+        return None
+    from cache_disco import CacheDisco
+    return CacheDisco(ruta)
+
+def notificar_cambios(conn):
+    # La versión en versiones_colegio (migración 005) solo sella el cache en
+    # disco: sin CACHE_DISCO las escrituras no tocan esa tabla. Todas las
+    # réplicas que compartan el disco deben tener el mismo CACHE_DISCO.
+    notificar_puntos(conn, colegio_id, con_version=get_cache_disco() is not None)
+
+def desde_disco(clave, colegio_id, cargar, max_edad_s, con_version=True):
+    cache = get_cache_disco()
+    if cache is None:
+        return cargar()
+    sello = 0
+    if con_version:
+        # Se lee antes de cargar: la entrada nunca dice ser más nueva que sus datos.
+        with engine.connect() as conn:
+            sello = version_en_base(conn, colegio_id)
+    return cache.obtener(f"{clave}:{colegio_id}", sello, cargar, max_edad_s)
+
+# =========================
+# 📌 Utilidades
+# =========================
+def get_profesor(email):
+    with engine.connect() as conn:
+        query = text("""
+            SELECT 
+                id, rol, fraternidad_id, colegio_id, 
+                (nombres || ' ' || apellidos) as nombre_completo,
+                asignatura, area, grados
+            FROM profesores
+            WHERE email = :email
+        """)
+        row = conn.execute(query, {"email": email}).fetchone()
+        return row
 
 # =========================
 # ✅ Ya logueado
@@ -105,11 +273,18 @@ with st.sidebar.form("cambiar_contrasena"):
             st.sidebar.error("⚠️ Las contraseñas no coinciden.")
         else:
             try:
-                supabase.auth.sign_in_with_password({
+                # Se vuelve a firmar en un cliente aparte: la contraseña actual
+                # pasa por Supabase Auth (con su límite de intentos) y los
+                # tokens de esta sesión, que pueden venir de la cookie, no se tocan.
+                cliente = nuevo_supabase()
+                cliente.auth.sign_in_with_password({
                     "email": st.session_state['user'].email,
                     "password": actual
                 })
-                supabase.auth.update_user({"password": nueva})
+                try:
+                    cliente.auth.update_user({"password": nueva})
+                finally:
+                    cliente.auth.sign_out({"scope": "local"})
                 st.sidebar.success("✅ Contraseña actualizada.")
             except Exception as e:
                 st.sidebar.error(f"❌ Error: {e}")
@@ -117,35 +292,379 @@ with st.sidebar.form("cambiar_contrasena"):
 # 🚪 Botón de cerrar sesión
 if st.sidebar.button("Cerrar sesión", use_container_width=True):
     try:
-        supabase.auth.sign_out()
+        sesion = st.session_state.get("sesion")
+        if sesion is not None:
+            # El cliente de esta sesión puede no tener tokens (sesión restaurada).
+            get_supabase().auth.admin.sign_out(sesion.access_token)
+        else:
+            get_supabase().auth.sign_out()
     finally:
-        st.session_state.clear()
+        olvidar_sesion()
         st.query_params["logout"] = "1"
 
 # =========================
 # 📂 Funciones DB (cache)
 # =========================
-@st.cache_data(ttl=60)
-def leer_resumen_estudiantes(colegio_id: str) -> pd.DataFrame:
-    q = text("SELECT * FROM resumen_puntos_estudiantes WHERE colegio_id = :cid")
-    with engine.connect() as conn:
-        df = pd.read_sql(q, conn, params={"cid": str(colegio_id)})
-    df.columns = df.columns.str.lower()
+# El resumen viene en formato largo (una fila por estudiante × valor), así que
+# los textos se repiten muchísimo: como categorías se guardan una sola vez.
+COLUMNAS_ID = ["estudiante_id", "colegio_id"]
+COLUMNAS_CATEGORIA = ["codigo", "nombre", "apellidos", "grado", "fraternidad", "colegio", "valor"]
+
+def compactar_resumen(df: pd.DataFrame) -> pd.DataFrame:
+    for col in COLUMNAS_ID:
+        if col in df.columns:
+            df[col] = df[col].astype(str).astype("category")
+    for col in COLUMNAS_CATEGORIA:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
     if "puntos" in df.columns:
-        df["puntos"] = pd.to_numeric(df["puntos"], errors="coerce").fillna(0).astype(int)
+        puntos = pd.to_numeric(df["puntos"], errors="coerce").fillna(0)
+        df["puntos"] = pd.to_numeric(puntos.astype("int64"), downcast="integer")
+    df.attrs["memoria_bytes"] = int(df.memory_usage(deep=True).sum())
     return df
 
+def texto(valor, vacio=""):
+    # Las categorías representan los NULL como NaN, no como None.
+    return vacio if pd.isna(valor) else str(valor)
+
+# `version` no se usa dentro: solo forma parte de la llave de cache para que
+# un aviso de cambios invalide únicamente los datos de ese colegio.
+@st.cache_data(ttl=60)
+def leer_resumen_estudiantes(colegio_id: str, version=None) -> pd.DataFrame:
+    def cargar():
+        q = text("SELECT * FROM resumen_puntos_estudiantes WHERE colegio_id = :cid")
+        with engine.connect() as conn:
+            df = pd.read_sql(q, conn, params={"cid": str(colegio_id)})
+        df.columns = df.columns.str.lower()
+        return compactar_resumen(df)
+    return desde_disco("resumen", colegio_id, cargar, EDAD_MAX_RESUMEN_S)
+
 @st.cache_data(ttl=60)
 def leer_valores(colegio_id: str) -> pd.DataFrame:
-    q = text("SELECT id, nombre FROM valores WHERE colegio_id = :cid ORDER BY nombre")
-    with engine.connect() as conn:
-        return pd.read_sql(q, conn, params={"cid": str(colegio_id)})
+    def cargar():
+        q = text("SELECT id, nombre FROM valores WHERE colegio_id = :cid ORDER BY nombre")
+        with engine.connect() as conn:
+            return pd.read_sql(q, conn, params={"cid": str(colegio_id)})
+    return desde_disco("valores", colegio_id, cargar, EDAD_MAX_CATALOGOS_S, con_version=False)
 
 @st.cache_data(ttl=60)
 def leer_fraternidades(colegio_id: str) -> pd.DataFrame:
-    q = text("SELECT id, nombre FROM fraternidades WHERE colegio_id = :cid ORDER BY nombre")
+    def cargar():
+        q = text("SELECT id, nombre FROM fraternidades WHERE colegio_id = :cid ORDER BY nombre")
+        with engine.connect() as conn:
+            return pd.read_sql(q, conn, params={"cid": str(colegio_id)})
+    return desde_disco("fraternidades", colegio_id, cargar, EDAD_MAX_CATALOGOS_S, con_version=False)
+
+@st.cache_data(ttl=60)
+def leer_estadisticas_colegio(colegio_id: str, version=None) -> pd.DataFrame:
+    q = text("""
+        SELECT f.nombre as fraternidad, COALESCE(SUM(t.puntos),0) as total_puntos
+        FROM fraternidades f
+        JOIN estudiantes e ON e.fraternidad_id = f.id AND e.colegio_id = :cid
+        LEFT JOIN LATERAL (
+            SELECT SUM(p.cantidad) AS puntos FROM saldo_puntos p WHERE p.estudiante_id = e.id
+        ) t ON true
+        GROUP BY f.nombre
+        ORDER BY total_puntos DESC
+    """)
+    with engine.connect() as conn:
+        return pd.read_sql(q, conn, params={"cid": colegio_id})
+
+@st.cache_data(ttl=60)
+def leer_leaderboard(colegio_id: str, version=None) -> pd.DataFrame:
+    q = text("""
+        SELECT f.nombre as fraternidad, COALESCE(SUM(p.cantidad),0) as total_puntos
+        FROM fraternidades f
+        LEFT JOIN estudiantes e ON e.fraternidad_id = f.id
+        LEFT JOIN saldo_puntos p ON e.id = p.estudiante_id
+        WHERE f.colegio_id = :cid
+        GROUP BY f.nombre
+        ORDER BY total_puntos DESC
+    """)
+    with engine.connect() as conn:
+        return pd.read_sql(q, conn, params={"cid": colegio_id})
+
+@st.cache_data(ttl=60)
+def leer_puntos_fraternidad_por_valor(colegio_id: str, fraternidad: str, version=None) -> pd.DataFrame:
+    q = text("""
+        SELECT v.nombre as valor, COALESCE(SUM(t.puntos),0) as total_puntos
+        FROM fraternidades f
+        JOIN estudiantes e ON e.fraternidad_id = f.id
+        JOIN valores v ON v.colegio_id = f.colegio_id
+        CROSS JOIN LATERAL (
+            SELECT SUM(p.cantidad) AS puntos
+            FROM saldo_puntos p
+            WHERE p.estudiante_id = e.id AND p.valor_id = v.id
+        ) t
+        WHERE f.colegio_id = :cid AND f.nombre = :fname
+        GROUP BY v.nombre
+        HAVING COUNT(t.puntos) > 0
+        ORDER BY total_puntos DESC
+    """)
+    with engine.connect() as conn:
+        return pd.read_sql(q, conn, params={"cid": colegio_id, "fname": fraternidad})
+
+@st.cache_data(ttl=60)
+def grafico_barras(df: pd.DataFrame, x: str, y: str, titulo: str) -> bytes:
+    # PNG cacheado: las vistas en vivo se redibujan seguido sin volver a
+    # pasar por matplotlib mientras los datos no cambien.
+    import io
+    fig, ax = nueva_figura()
+    df.plot(kind="bar", x=x, y=y, ax=ax, legend=False)
+    ax.set_ylabel("Puntos")
+    ax.set_title(titulo)
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", bbox_inches="tight")
+    fig.clear()
+    return buf.getvalue()
+
+@st.cache_data(ttl=60)
+def leer_actividad_profesores(colegio_id: str, semanas: int) -> pd.DataFrame:
+    # Lee solo los contadores semanales; nunca recorre la tabla puntos.
+    q = text("""
+        SELECT (pr.nombres || ' ' || pr.apellidos) AS profesor,
+               COALESCE(f.nombre, '-') AS fraternidad,
+               v.nombre AS valor, c.semana, c.asignaciones, c.total_puntos
+        FROM contadores_puntos_profesor c
+        JOIN valores v ON v.id = c.valor_id
+        LEFT JOIN profesores pr ON pr.id = c.profesor_id
+        LEFT JOIN fraternidades f ON f.id = c.fraternidad_id
+        WHERE c.colegio_id = :cid
+          AND c.semana >= date_trunc('week', now())::date - (:semanas * 7)
+    """)
+    with engine.connect() as conn:
+        df = pd.read_sql(q, conn, params={"cid": str(colegio_id), "semanas": int(semanas)})
+    df["profesor"] = df["profesor"].fillna("(sin profesor)")
+    return df
+
+# =========================
+# 🌐 Red de colegios (rol admin_red)
+# =========================
+# Cada colegio se agrega por separado (y se cachea por separado) en un pool
+# acotado de hilos: con N hilos, la vista tarda más o menos la suma de los
+# colegios dividida en N (nunca menos que el más lento). Cada hilo ocupa una
+# conexión del engine, así que los hilos no pasan de pool_size - 1: siempre
+# queda una conexión para el resto de la app. HILOS_RED en los secrets
+# cambia el valor por defecto.
+MAX_HILOS_RED = 4
+
+def hilos_red(colegios: int) -> int:
+    configurados = int(st.secrets.get("HILOS_RED", MAX_HILOS_RED))
+    return max(1, min(configurados, engine.pool.size() - 1, colegios))
+
+@st.cache_data(ttl=300)
+def leer_colegios() -> pd.DataFrame:
+    with engine.connect() as conn:
+        return pd.read_sql(text("SELECT id, nombre FROM colegios ORDER BY nombre"), conn)
+
+@st.cache_data(ttl=60)
+def leer_metricas_colegio(colegio_id: str, semanas: int, version=None) -> dict:
+    q = text("""
+        SELECT (SELECT count(*) FROM estudiantes WHERE colegio_id = :cid) AS estudiantes,
+               COALESCE(SUM(c.asignaciones), 0)::bigint AS asignaciones,
+               -- SUM de bigint devuelve numeric (Decimal en Python); se castea
+               -- para que las métricas se puedan dividir en pandas.
+               COALESCE(SUM(c.total_puntos), 0)::bigint AS puntos_otorgados,
+               COUNT(DISTINCT c.profesor_id) FILTER (WHERE c.asignaciones > 0) AS profesores_activos
+        FROM contadores_puntos_profesor c
+        WHERE c.colegio_id = :cid
+          AND c.semana >= date_trunc('week', now())::date - (:semanas * 7)
+    """)
+    with engine.connect() as conn:
+        return dict(conn.execute(q, {"cid": str(colegio_id), "semanas": int(semanas)}).mappings().one())
+
+@st.cache_data(ttl=60)
+def leer_leaderboard_semanas(colegio_id: str, semanas: int, version=None) -> pd.DataFrame:
+    # Mismo periodo que las métricas: sale de los contadores semanales, no del libro.
+    q = text("""
+        SELECT f.nombre AS fraternidad, COALESCE(SUM(c.total_puntos), 0)::bigint AS total_puntos
+        FROM fraternidades f
+        LEFT JOIN contadores_puntos_profesor c
+               ON c.fraternidad_id = f.id
+              AND c.colegio_id = :cid
+              AND c.semana >= date_trunc('week', now())::date - (:semanas * 7)
+        WHERE f.colegio_id = :cid
+        GROUP BY f.nombre
+        ORDER BY total_puntos DESC
+    """)
+    with engine.connect() as conn:
+        return pd.read_sql(q, conn, params={"cid": str(colegio_id), "semanas": int(semanas)})
+
+def calcular_red(colegios: pd.DataFrame, semanas: int, hilos: int):
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+    ctx = get_script_run_ctx()
+
+    def por_colegio(fila):
+        add_script_run_ctx(threading.current_thread(), ctx)
+        cid = str(fila.id)
+        t0 = time.perf_counter()
+        version = version_datos(cid)
+        metricas = leer_metricas_colegio(cid, semanas, version)
+        leaderboard = leer_leaderboard_semanas(cid, semanas, version)
+        return fila.nombre, metricas, leaderboard, time.perf_counter() - t0
+
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        return list(pool.map(por_colegio, colegios.itertuples(index=False)))
+
+# =========================
+# 🧾 Historial de puntos (paginación por cursor)
+# =========================
+HISTORIAL_POR_PAGINA = 20
+HISTORIAL_FILTROS = {"estudiante": "p.estudiante_id", "profesor": "p.profesor_id"}
+
+def leer_historial_puntos(por: str, ref_id: str, cursor=None, limite: int = HISTORIAL_POR_PAGINA):
+    # Keyset sobre (created_at, id): cada página es un index scan acotado por LIMIT,
+    # sin OFFSET, así que cuesta lo mismo en la página 1 que en la 500.
+    filtro = HISTORIAL_FILTROS[por]
+    condicion_cursor = "AND (p.created_at, p.id) < (:cur_ts, :cur_id)" if cursor else ""
+    q = text(f"""
+        SELECT p.id, p.created_at AS fecha, v.nombre AS valor, p.cantidad,
+               (e.nombre || ' ' || e.apellidos) AS estudiante, e.grado,
+               (pr.nombres || ' ' || pr.apellidos) AS profesor
+        FROM puntos p
+        JOIN valores v ON v.id = p.valor_id
+        JOIN estudiantes e ON e.id = p.estudiante_id
+        LEFT JOIN profesores pr ON pr.id = p.profesor_id
+        WHERE {filtro} = :ref {condicion_cursor}
+        ORDER BY p.created_at DESC, p.id DESC
+        LIMIT :lim
+    """)
+    params = {"ref": str(ref_id), "lim": int(limite) + 1}
+    if cursor:
+        params["cur_ts"], params["cur_id"] = cursor
+    with engine.connect() as conn:
+        df = pd.read_sql(q, conn, params=params)
+
+    siguiente = None
+    if len(df) > limite:
+        df = df.iloc[:limite]
+        ultima = df.iloc[-1]
+        siguiente = (ultima["fecha"].to_pydatetime(), str(ultima["id"]))
+    return df, siguiente
+
+@st.cache_data(ttl=600)
+def leer_corte_historial():
+    # Fin del último periodo compactado (periodos.py): antes de esa fecha el
+    # detalle está en el esquema archivo y solo quedan los saldos sumados.
+    with engine.connect() as conn:
+        return conn.execute(text("""
+            SELECT max(hasta) FROM periodos_puntos WHERE compactado_en IS NOT NULL
+        """)).scalar()
+
+def mostrar_historial(clave: str, por: str, ref_id: str, columnas: list):
+    # En sesión solo guardamos la pila de cursores de las páginas visitadas.
+    estado = st.session_state.setdefault(clave, {"ref": None, "cursores": [None]})
+    if estado["ref"] != str(ref_id):
+        estado["ref"], estado["cursores"] = str(ref_id), [None]
+    cursores = estado["cursores"]
+
+    pagina, siguiente = leer_historial_puntos(por, ref_id, cursores[-1])
+    corte = leer_corte_historial()
+    aviso_corte = (f"📦 El detalle empieza el {corte:%Y-%m-%d}: los periodos anteriores están "
+                   f"compactados y sus puntos siguen sumando en los totales.") if corte else None
+    if pagina.empty:
+        st.info("ℹ️ No hay puntos registrados todavía." if corte is None
+                else f"ℹ️ No hay puntos registrados desde el {corte:%Y-%m-%d}.")
+        if aviso_corte:
+            st.caption(aviso_corte)
+        return
+
+    st.dataframe(pagina[columnas], use_container_width=True, hide_index=True)
+    col_prev, col_pag, col_next = st.columns([1, 1, 1])
+    with col_prev:
+        if st.button("⬅️ Más recientes", disabled=len(cursores) == 1, key=f"{clave}_prev", use_container_width=True):
+            cursores.pop()
+            st.rerun()
+    with col_pag:
+        st.caption(f"Página {len(cursores)}")
+    with col_next:
+        if st.button("Más antiguos ➡️", disabled=siguiente is None, key=f"{clave}_next", use_container_width=True):
+            cursores.append(siguiente)
+            st.rerun()
+    if siguiente is None and aviso_corte:
+        st.caption(aviso_corte)
+
+# =========================
+# 🎓 Tabla por grado y sección (paginada en la base)
+# =========================
+# La tabla solo recibe una página; la selección vive en sesión como un
+# conjunto de ids, así que cambiar de página o de filtro no la pierde.
+SECCION_POR_PAGINA = 50
+
+def patron_busqueda(busqueda: str):
+    busqueda = (busqueda or "").strip()
+    if not busqueda:
+        return None
+    escapado = busqueda.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escapado}%"
+
+@st.cache_data(ttl=60)
+def leer_pagina_seccion(colegio_id: str, grados: tuple, frat_id=None, patron=None, cursor=None,
+                        version=None, limite: int = SECCION_POR_PAGINA):
+    # Keyset sobre (apellidos, nombre, id), igual que el historial; los puntos
+    # se suman solo para los estudiantes de la página. Cada grado se lee en
+    # orden desde estudiantes_seccion_orden_idx (migración 007) y corta en
+    # LIMIT; solo se ordenan esas filas, no el grado completo.
+    q = text("""
+        SELECT e.id AS estudiante_id, e.codigo, e.nombre, e.apellidos,
+               f.nombre AS fraternidad, e.grado, COALESCE(t.puntos, 0) AS puntos
+        FROM (
+            SELECT s.*
+            FROM unnest(CAST(:grados AS text[])) AS g(grado)
+            CROSS JOIN LATERAL (
+                SELECT id, codigo, nombre, apellidos, grado, fraternidad_id
+                FROM estudiantes
+                WHERE colegio_id = :cid
+                  AND grado = g.grado
+                  AND (CAST(:frat AS uuid) IS NULL OR fraternidad_id = CAST(:frat AS uuid))
+                  AND (CAST(:patron AS text) IS NULL OR concat_ws(' ', codigo, nombre, apellidos) ILIKE :patron)
+                  AND (CAST(:cur_id AS uuid) IS NULL
+                       OR (COALESCE(apellidos, ''), COALESCE(nombre, ''), id) > (:cur_ape, :cur_nom, CAST(:cur_id AS uuid)))
+                ORDER BY COALESCE(apellidos, ''), COALESCE(nombre, ''), id
+                LIMIT :lim
+            ) s
+            ORDER BY COALESCE(s.apellidos, ''), COALESCE(s.nombre, ''), s.id
+            LIMIT :lim
+        ) e
+        LEFT JOIN fraternidades f ON f.id = e.fraternidad_id
+        LEFT JOIN LATERAL (
+            SELECT SUM(p.cantidad) AS puntos
+            FROM saldo_puntos p
+            WHERE p.estudiante_id = e.id
+        ) t ON true
+        ORDER BY COALESCE(e.apellidos, ''), COALESCE(e.nombre, ''), e.id
+    """)
+    cur_ape, cur_nom, cur_id = cursor or (None, None, None)
+    params = {"cid": str(colegio_id), "grados": list(grados), "frat": frat_id, "patron": patron,
+              "cur_ape": cur_ape, "cur_nom": cur_nom, "cur_id": cur_id, "lim": int(limite) + 1}
+    with engine.connect() as conn:
+        df = pd.read_sql(q, conn, params=params)
+    df["estudiante_id"] = df["estudiante_id"].astype(str)
+
+    siguiente = None
+    if len(df) > limite:
+        df = df.iloc[:limite]
+        ultima = df.iloc[-1]
+        siguiente = (texto(ultima["apellidos"]), texto(ultima["nombre"]), ultima["estudiante_id"])
+    return df, siguiente
+
+@st.cache_data(ttl=60)
+def leer_ids_seccion(colegio_id: str, grados: tuple, frat_id=None, patron=None, version=None) -> list:
+    # Todos los que coinciden con el filtro: sirve para el conteo y para
+    # "seleccionar todos" sin pasar el listado completo por la tabla.
+    q = text("""
+        SELECT id
+        FROM estudiantes
+        WHERE colegio_id = :cid
+          AND grado = ANY(:grados)
+          AND (CAST(:frat AS uuid) IS NULL OR fraternidad_id = CAST(:frat AS uuid))
+          AND (CAST(:patron AS text) IS NULL OR concat_ws(' ', codigo, nombre, apellidos) ILIKE :patron)
+    """)
     with engine.connect() as conn:
-        return pd.read_sql(q, conn, params={"cid": str(colegio_id)})
+        filas = conn.execute(q, {"cid": str(colegio_id), "grados": list(grados),
+                                 "frat": frat_id, "patron": patron}).fetchall()
+    return [str(f[0]) for f in filas]
 
 # =========================
 # ✏️ CRUD estudiante
@@ -164,7 +683,8 @@ def actualizar_estudiante_full(estudiante_id, codigo, nombre, apellidos, grado,
             "frat": str(fraternidad_id) if fraternidad_id else None,
             "id": str(estudiante_id)
         })
-    leer_resumen_estudiantes.clear()
+        notificar_cambios(conn)
+    datos_cambiaron(colegio_id)
 
 def insertar_estudiante(codigo, nombre, apellidos, grado, fraternidad_id, colegio_id):
     with engine.begin() as conn:
@@ -179,7 +699,8 @@ def insertar_estudiante(codigo, nombre, apellidos, grado, fraternidad_id, colegi
             "frat": str(fraternidad_id) if fraternidad_id else None,
             "colegio": str(colegio_id)
         })
-    leer_resumen_estudiantes.clear()
+        notificar_cambios(conn)
+    datos_cambiaron(colegio_id)
 
 # =========================
 # 🧮 Puntos
@@ -210,7 +731,35 @@ def actualizar_puntos(estudiante_id, valor_nombre, delta, profesor_id=None):
             "cantidad": int(delta),
             "profesor_id": str(prof_id)
         })
-    leer_resumen_estudiantes.clear()
+        notificar_cambios(conn)
+    datos_cambiaron(colegio_id)
+
+def asignar_puntos_estudiantes(estudiante_ids, valor_nombre, delta, profesor_id) -> int:
+    # Un solo INSERT ... SELECT para todo el conjunto, en una transacción.
+    if delta == 0 or not estudiante_ids:
+        return 0
+    with engine.begin() as conn:
+        valor_q = conn.execute(
+            text("SELECT id FROM valores WHERE nombre=:valor AND colegio_id=:colegio"),
+            {"valor": valor_nombre, "colegio": str(colegio_id)}
+        ).fetchone()
+        if not valor_q:
+            return 0
+        insertados = conn.execute(text("""
+            INSERT INTO puntos (estudiante_id, valor_id, cantidad, profesor_id)
+            SELECT e.id, CAST(:valor_id AS uuid), :cantidad, CAST(:profesor_id AS uuid)
+            FROM estudiantes e
+            WHERE e.id = ANY(CAST(:ids AS uuid[])) AND e.colegio_id = :cid
+        """), {
+            "ids": [str(i) for i in estudiante_ids],
+            "valor_id": str(valor_q[0]),
+            "cantidad": int(delta),
+            "profesor_id": str(profesor_id),
+            "cid": str(colegio_id)
+        }).rowcount
+        notificar_cambios(conn)
+    datos_cambiaron(colegio_id)
+    return insertados
 
 def asignar_puntos_fraternidad(fraternidad_id, valor_nombre, delta, profesor_id):
     if delta == 0:
@@ -239,44 +788,43 @@ def asignar_puntos_fraternidad(fraternidad_id, valor_nombre, delta, profesor_id)
                 "cantidad": int(delta),
                 "profesor_id": str(profesor_id)
             })
-    leer_resumen_estudiantes.clear()
+        notificar_cambios(conn)
+    datos_cambiaron(colegio_id)
 
 
 # =========================
 # 🏆 App principal (tabs)
 # =========================
 st.title("🏆 Sistema de Puntos Hogwarts")
-tabs = st.tabs(["📊 Estadísticas", "🎓 Estudiantes", "🏠 Fraternidades", "👨‍🏫 Profesores"])
+nombres_tabs = ["📊 Estadísticas", "🎓 Estudiantes", "🏠 Fraternidades", "👨‍🏫 Profesores", "🧾 Mis asignaciones"]
+if rol == "admin_red":
+    nombres_tabs.append("🌐 Red de colegios")
+tabs = st.tabs(nombres_tabs)
 
 # ---- TAB 1: Estadísticas ----
 with tabs[0]:
     st.header("📊 Estadísticas generales del colegio")
-    q = text("""
-        SELECT f.nombre as fraternidad, COALESCE(SUM(p.cantidad),0) as total_puntos
-        FROM fraternidades f
-        JOIN estudiantes e ON e.fraternidad_id = f.id AND e.colegio_id = :cid
-        LEFT JOIN puntos p ON e.id = p.estudiante_id
-        GROUP BY f.nombre
-        ORDER BY total_puntos DESC
-    """)
-    with engine.connect() as conn:
-        stats = pd.read_sql(q, conn, params={"cid": colegio_id})
-
-    if not stats.empty:
-        st.dataframe(stats, use_container_width=True)
-        fig, ax = plt.subplots(figsize=(6,3))
-        stats.plot(kind="bar", x="fraternidad", y="total_puntos", ax=ax, legend=False)
-        ax.set_ylabel("Puntos")
-        ax.set_title("🏆 Comparativa de fraternidades")
-        st.pyplot(fig)
-    else:
-        st.info("ℹ️ No hay puntos registrados todavía.")
+
+    # Se redibuja solo cada pocos segundos; consulta la base únicamente
+    # cuando llegó un aviso de cambios para este colegio.
+    @st.fragment(run_every=REFRESCO_LEADERBOARD)
+    def estadisticas_en_vivo():
+        stats = leer_estadisticas_colegio(colegio_id, version_datos(colegio_id))
+        if not stats.empty:
+            st.dataframe(stats, use_container_width=True)
+            st.image(grafico_barras(stats, "fraternidad", "total_puntos", "🏆 Comparativa de fraternidades"))
+        else:
+            st.info("ℹ️ No hay puntos registrados todavía.")
+
+    estadisticas_en_vivo()
 
 
 # ---- TAB 2: Estudiantes ----
 with tabs[1]:
     st.header("🎓 Buscar y gestionar estudiantes")
-    df = leer_resumen_estudiantes(colegio_id)
+    df = leer_resumen_estudiantes(colegio_id, version_datos(colegio_id))
+    st.caption(f"💾 Resumen en memoria: {df.attrs.get('memoria_bytes', 0) / 1024:,.0f} KB "
+               f"({df['estudiante_id'].nunique() if not df.empty else 0} estudiantes)")
 
     estudiante_seleccionado = None
 
@@ -285,7 +833,7 @@ with tabs[1]:
     # ========================
     st.subheader("🔎 Búsqueda individual (detalle completo)")
     opciones_individual = df.drop_duplicates(subset=["estudiante_id"]).apply(
-        lambda r: f"{r['codigo'] or ''} | {r['nombre']} {r['apellidos']} | {r['grado']} | {r['fraternidad'] or '-'}",
+        lambda r: f"{texto(r['codigo'])} | {r['nombre']} {r['apellidos']} | {r['grado']} | {texto(r['fraternidad'], '-')}",
         axis=1
     ).tolist()
 
@@ -302,7 +850,7 @@ with tabs[1]:
     # ========================
     st.subheader("🔎 Búsqueda por estudiantes (múltiple)")
     opciones_multi = df.drop_duplicates(subset=["estudiante_id"]).apply(
-        lambda r: f"{r['codigo'] or ''} | {r['nombre']} {r['apellidos']} | {r['grado']} | {r['fraternidad'] or '-'}",
+        lambda r: f"{texto(r['codigo'])} | {r['nombre']} {r['apellidos']} | {r['grado']} | {texto(r['fraternidad'], '-')}",
         axis=1
     ).tolist()
 
@@ -343,57 +891,124 @@ with tabs[1]:
     grados_numeros = sorted({partir_grado(g)[0] for g in grados_unicos if partir_grado(g)[0]})
     grado_sel = st.selectbox("Selecciona el grado:", [""] + grados_numeros, index=0, key="grado_sel")
 
-    if grado_sel != "":
-        secciones = sorted({partir_grado(g)[1] for g in grados_unicos if partir_grado(g)[0] == grado_sel})
-        seccion_sel = st.selectbox("Selecciona la sección:", [""] + secciones, index=0, key="seccion_sel")
+    TODAS_SECCIONES = "Todas"
 
-        if seccion_sel != "":
-            grado_completo = f"{grado_sel}{seccion_sel}"
-            # Agrupar por estudiante y sumar puntos
-            df_filtrado = (df[df["grado"] == grado_completo]
-                           .groupby(["estudiante_id","codigo","nombre","apellidos","fraternidad","grado"], as_index=False)
-                           .agg({"puntos": "sum"})
-                           .sort_values(["apellidos","nombre"], na_position="last"))
+    # Solo esta parte se vuelve a ejecutar al marcar casillas o cambiar de página.
+    @st.fragment
+    def tabla_seccion(grados: tuple, ambito: str):
+        estado = st.session_state.setdefault("tabla_seccion", {
+            "ambito": None, "filtro": None, "cursores": [None], "ids": set(), "editor": 0, "detalle": None})
+        if estado["ambito"] != ambito:
+            estado.update(ambito=ambito, filtro=None, cursores=[None], ids=set(), detalle=None)
+            estado["editor"] += 1
 
-
-            if df_filtrado.empty:
-                st.warning("⚠️ No hay estudiantes en este grado y sección.")
+        frats_df = leer_fraternidades(colegio_id)
+        col_frat, col_buscar = st.columns([1, 2])
+        with col_frat:
+            frat_nombre = st.selectbox("Fraternidad", ["Todas"] + frats_df["nombre"].tolist(), key="tabla_seccion_frat")
+        with col_buscar:
+            busqueda = st.text_input("Nombre o código", key="tabla_seccion_buscar")
+        frat_id = None if frat_nombre == "Todas" else str(frats_df.loc[frats_df["nombre"] == frat_nombre, "id"].iloc[0])
+        patron = patron_busqueda(busqueda)
+        if estado["filtro"] != (frat_id, patron):
+            estado["filtro"], estado["cursores"] = (frat_id, patron), [None]
+            estado["editor"] += 1
+
+        ids = estado["ids"]
+        cursores = estado["cursores"]
+        version = version_datos(colegio_id)
+        coinciden = leer_ids_seccion(colegio_id, grados, frat_id, patron, version)
+        pagina, siguiente = leer_pagina_seccion(colegio_id, grados, frat_id, patron, cursores[-1], version)
+
+        if pagina.empty:
+            st.warning("⚠️ No hay estudiantes que coincidan en este grado y sección.")
+        else:
+            pagina["Seleccionar"] = pagina["estudiante_id"].isin(ids)
+            # Cada página, cada versión de los datos y cada cambio de selección
+            # hecho por botones usa su propia llave: las ediciones que el editor
+            # guarda por posición de fila no caen sobre otras filas si la página
+            # cambió por debajo (un estudiante nuevo, otro profesor asignando).
+            epoca, cambios = version
+            desde = cursores[-1][2] if cursores[-1] else "inicio"
+            editada = st.data_editor(
+                pagina[["estudiante_id","codigo","nombre","apellidos","fraternidad","grado","puntos","Seleccionar"]],
+                use_container_width=True,
+                hide_index=True,
+                disabled=["codigo","nombre","apellidos","fraternidad","grado","puntos"],
+                column_config={
+                    "Seleccionar": st.column_config.CheckboxColumn(required=True),
+                    "estudiante_id": None
+                },
+                key=f"tabla_jerarquica_{estado['editor']}_{epoca}_{cambios}_{desde}"
+            )
+            marcados = set(editada.loc[editada["Seleccionar"] == True, "estudiante_id"])
+            ids -= set(pagina["estudiante_id"]) - marcados
+            ids |= marcados
+
+            # Los botones cambian el estado en callbacks: se aplican antes de
+            # volver a dibujar el fragmento, sin un rerun adicional.
+            col_prev, col_pag, col_next = st.columns([1, 1, 1])
+            with col_prev:
+                st.button("⬅️ Anteriores", disabled=len(cursores) == 1, key="tabla_seccion_prev",
+                          on_click=cursores.pop, use_container_width=True)
+            with col_pag:
+                paginas = max(1, -(-len(coinciden) // SECCION_POR_PAGINA))
+                st.caption(f"Página {len(cursores)} de {paginas} · {len(coinciden)} estudiante(s)")
+            with col_next:
+                st.button("Siguientes ➡️", disabled=siguiente is None, key="tabla_seccion_next",
+                          on_click=cursores.append, args=(siguiente,), use_container_width=True)
+
+        def cambiar_seleccion(agregar):
+            if agregar:
+                ids.update(agregar)
             else:
-                df_filtrado = df_filtrado.reset_index(drop=True)
-                df_filtrado["Seleccionar"] = False
-
-                df_sel = st.data_editor(
-                    df_filtrado[["estudiante_id","codigo","nombre","apellidos","fraternidad","grado","puntos","Seleccionar"]],
-                    use_container_width=True,
-                    hide_index=True,
-                    column_config={
-                        "Seleccionar": st.column_config.CheckboxColumn(required=True),
-                        "estudiante_id": None
-                    },
-                    key="tabla_jerarquica"
-                )
-
-                seleccionados = df_sel[df_sel["Seleccionar"] == True]
-                ids_seleccionados = seleccionados["estudiante_id"].astype(str).tolist()
+                ids.clear()
+            estado["editor"] += 1
+
+        col_todos, col_limpiar = st.columns([1, 1])
+        with col_todos:
+            st.button(f"☑️ Seleccionar los {len(coinciden)} que coinciden", disabled=not coinciden,
+                      key="tabla_seccion_todos", on_click=cambiar_seleccion, args=(coinciden,),
+                      use_container_width=True)
+        with col_limpiar:
+            st.button("🧹 Limpiar selección", disabled=not ids, key="tabla_seccion_limpiar",
+                      on_click=cambiar_seleccion, args=([],), use_container_width=True)
+
+        if ids:
+            st.success(f"✅ {len(ids)} estudiante(s) seleccionado(s) en jerárquico")
+            valores_df = leer_valores(colegio_id)
+            st.subheader("➕ Asignar puntos a seleccionados (jerárquico)")
+            categoria = st.selectbox("Categoría", valores_df["nombre"].tolist(), key="categoria_masiva_jerq")
+            delta = st.number_input("Puntos (+/-)", min_value=-50, max_value=50, value=1, step=1, key="delta_masiva_jerq")
+
+            if st.button("Asignar puntos (jerárquico)", type="primary", use_container_width=True):
+                asignados = asignar_puntos_estudiantes(ids, str(categoria), int(delta), profesor_id)
+                st.success(f"✅ {delta:+} puntos asignados a {asignados} estudiante(s).")
+                st.rerun()
 
-                if ids_seleccionados:
-                    st.success(f"✅ {len(ids_seleccionados)} estudiante(s) seleccionado(s) en jerárquico")
-                    valores_df = leer_valores(colegio_id)
-                    st.subheader("➕ Asignar puntos a seleccionados (jerárquico)")
-                    categoria = st.selectbox("Categoría", valores_df["nombre"].tolist(), key="categoria_masiva_jerq")
-                    delta = st.number_input("Puntos (+/-)", min_value=-50, max_value=50, value=1, step=1, key="delta_masiva_jerq")
+        # si hay uno solo → mostrar detalle abajo (fuera del fragmento)
+        unico = next(iter(ids)) if len(ids) == 1 else None
+        if unico != estado["detalle"]:
+            estado["detalle"] = unico
+            if unico is not None:
+                st.session_state["estudiante_sel_id"] = unico
+                st.rerun()
+        return unico
 
-                    if st.button("Asignar puntos (jerárquico)", type="primary", use_container_width=True):
-                        for est_id in ids_seleccionados:
-                            actualizar_puntos(str(est_id), str(categoria), int(delta), profesor_id)
-                        st.success(f"✅ {delta:+} puntos asignados a {len(ids_seleccionados)} estudiante(s).")
-                        st.rerun()
+    if grado_sel != "":
+        secciones = sorted({partir_grado(g)[1] for g in grados_unicos if partir_grado(g)[0] == grado_sel})
+        seccion_sel = st.selectbox("Selecciona la sección:", ["", TODAS_SECCIONES] + secciones, index=0, key="seccion_sel")
 
-                    # si hay uno solo → mostrar detalle abajo
-                    if len(ids_seleccionados) == 1:
-                        est_row = df_filtrado.loc[seleccionados.index[0]]
-                        estudiante_seleccionado = est_row
-                        st.session_state["estudiante_sel_id"] = str(est_row["estudiante_id"])
+        if seccion_sel != "":
+            grados = tuple(sorted(g for g in grados_unicos
+                                  if partir_grado(g)[0] == grado_sel
+                                  and seccion_sel in (TODAS_SECCIONES, partir_grado(g)[1])))
+            unico = tabla_seccion(grados, f"{grado_sel}{seccion_sel}")
+            if unico is not None:
+                cand = df[df["estudiante_id"] == unico]
+                if not cand.empty:
+                    estudiante_seleccionado = cand.drop_duplicates(subset=["estudiante_id"]).iloc[0]
+                    st.session_state["estudiante_sel_id"] = unico
 
     # ========================
     # Detalle del estudiante (INDIVIDUAL o jerárquico 1)
@@ -406,17 +1021,17 @@ with tabs[1]:
 
     if estudiante_seleccionado is not None:
         r = estudiante_seleccionado
-        st.markdown(f"## 👤 {r['nombre']} {r['apellidos']} | 🎓 {r['grado']} | 🏠 {r['fraternidad']}")
+        st.markdown(f"## 👤 {r['nombre']} {r['apellidos']} | 🎓 {r['grado']} | 🏠 {texto(r['fraternidad'], '-')}")
 
         # 👉 Si el rol es director, permitir edición
         if rol == "director":
             st.subheader("✏️ Editar datos del estudiante")
             frats_df = leer_fraternidades(colegio_id)
             with st.form("editar_estudiante"):
-                codigo_n = st.text_input("Código", value=r["codigo"] or "")
-                nombre_n = st.text_input("Nombre", value=r["nombre"] or "")
-                apellidos_n = st.text_input("Apellidos", value=r["apellidos"] or "")
-                grado_n = st.text_input("Grado", value=r["grado"] or "")
+                codigo_n = st.text_input("Código", value=texto(r["codigo"]))
+                nombre_n = st.text_input("Nombre", value=texto(r["nombre"]))
+                apellidos_n = st.text_input("Apellidos", value=texto(r["apellidos"]))
+                grado_n = st.text_input("Grado", value=texto(r["grado"]))
                 frat_n = st.selectbox("Fraternidad", frats_df["nombre"].tolist(), 
                                       index=frats_df["nombre"].tolist().index(r["fraternidad"]) if r["fraternidad"] in frats_df["nombre"].tolist() else 0)
                 submit_edit = st.form_submit_button("Actualizar estudiante")
@@ -442,12 +1057,16 @@ with tabs[1]:
         st.dataframe(tabla, use_container_width=True, hide_index=True)
 
         if not tabla.empty:
-            fig, ax = plt.subplots(figsize=(6,3))
+            fig, ax = nueva_figura()
             tabla.plot(kind="bar", x="Valor", y="Puntos", ax=ax, legend=False)
             ax.set_ylabel("Puntos")
             ax.set_title("Distribución de valores")
             st.pyplot(fig)
 
+        st.subheader("🧾 Historial de puntos")
+        mostrar_historial("historial_estudiante", "estudiante", r["estudiante_id"],
+                          ["fecha", "valor", "cantidad", "profesor"])
+
         st.subheader("➕ Asignar puntos al estudiante")
         if valores_df.empty:
             st.info("No hay valores configurados en el colegio.")
@@ -497,12 +1116,52 @@ with tabs[1]:
                                 "frat": frat_id,
                                 "colegio": str(colegio_id)
                             })
-                        clear_all_caches()
+                            notificar_cambios(conn)
+                        datos_cambiaron(colegio_id)
                         st.success("✅ Estudiante agregado exitosamente.")
                         st.rerun()
                     except Exception as e:
                         st.error(f"❌ Error al agregar estudiante: {e}")
 
+    # ========================
+    # 🗂️ Boletines por lote
+    # ========================
+    st.subheader("🗂️ Boletines por lote")
+    secciones_todas = sorted({partir_grado(g)[1] for g in grados_unicos if partir_grado(g)[1]})
+    with st.form("boletines_lote"):
+        col_g, col_s, col_f = st.columns([2, 2, 1])
+        with col_g:
+            grado_bol = st.selectbox("Grado", ["Todo el colegio"] + grados_numeros)
+        with col_s:
+            seccion_bol = st.selectbox("Sección", ["Todas"] + secciones_todas)
+        with col_f:
+            formato_bol = st.radio("Formato", ["pdf", "png"], format_func=str.upper)
+        generar_bol = st.form_submit_button("Generar boletines")
+
+    if generar_bol:
+        from boletines import ejecutar_lote, preparar_boletines
+
+        # Sale del mismo resumen cacheado de la pestaña: no hay consultas por estudiante.
+        lote = preparar_boletines(df,
+                                  None if grado_bol == "Todo el colegio" else grado_bol,
+                                  None if grado_bol == "Todo el colegio" or seccion_bol == "Todas" else seccion_bol)
+        if not lote:
+            st.warning("⚠️ No hay estudiantes para ese grado y sección.")
+        else:
+            barra = st.progress(0.0, text=f"0/{len(lote)} boletines")
+            contenido = ejecutar_lote(
+                lote, formato_bol,
+                al_avanzar=lambda hechos, total, por_seg: barra.progress(
+                    hechos / total, text=f"{hechos}/{total} boletines · {por_seg:.1f} boletines/s")
+            )
+            alcance = "colegio" if grado_bol == "Todo el colegio" else f"{grado_bol}{'' if seccion_bol == 'Todas' else seccion_bol}"
+            st.session_state["boletines_zip"] = (f"boletines_{alcance}.zip", contenido)
+
+    if "boletines_zip" in st.session_state:
+        nombre_zip, contenido_zip = st.session_state["boletines_zip"]
+        st.download_button(f"⬇️ Descargar {nombre_zip}", contenido_zip, file_name=nombre_zip,
+                           mime="application/zip", use_container_width=True)
+
 
 # ---- TAB 3: Fraternidades ----
 with tabs[2]:
@@ -518,27 +1177,17 @@ with tabs[2]:
         # 🏆 Leaderboard general de fraternidades
         # ===================================
         st.subheader("🏆 Leaderboard de fraternidades")
-        q_leader = text("""
-            SELECT f.nombre as fraternidad, COALESCE(SUM(p.cantidad),0) as total_puntos
-            FROM fraternidades f
-            LEFT JOIN estudiantes e ON e.fraternidad_id = f.id
-            LEFT JOIN puntos p ON e.id = p.estudiante_id
-            WHERE f.colegio_id = :cid
-            GROUP BY f.nombre
-            ORDER BY total_puntos DESC
-        """)
-        with engine.connect() as conn:
-            df_leader = pd.read_sql(q_leader, conn, params={"cid": colegio_id})
 
-        if not df_leader.empty:
-            st.dataframe(df_leader, use_container_width=True, hide_index=True)
-            fig, ax = plt.subplots(figsize=(6,3))
-            df_leader.plot(kind="bar", x="fraternidad", y="total_puntos", ax=ax, legend=False)
-            ax.set_ylabel("Puntos")
-            ax.set_title("Ranking de fraternidades")
-            st.pyplot(fig)
-        else:
-            st.info("ℹ️ No hay puntos registrados aún.")
+        @st.fragment(run_every=REFRESCO_LEADERBOARD)
+        def leaderboard_en_vivo():
+            df_leader = leer_leaderboard(colegio_id, version_datos(colegio_id))
+            if not df_leader.empty:
+                st.dataframe(df_leader, use_container_width=True, hide_index=True)
+                st.image(grafico_barras(df_leader, "fraternidad", "total_puntos", "Ranking de fraternidades"))
+            else:
+                st.info("ℹ️ No hay puntos registrados aún.")
+
+        leaderboard_en_vivo()
 
         # ===================================
         # 📊 Estadísticas por fraternidad y valor
@@ -547,22 +1196,11 @@ with tabs[2]:
         frat_sel = st.selectbox("Selecciona fraternidad", frats["nombre"].tolist())
 
         if frat_sel:
-            q_valores = text("""
-                SELECT v.nombre as valor, COALESCE(SUM(p.cantidad),0) as total_puntos
-                FROM valores v
-                LEFT JOIN puntos p ON v.id = p.valor_id
-                LEFT JOIN estudiantes e ON p.estudiante_id = e.id
-                LEFT JOIN fraternidades f ON e.fraternidad_id = f.id
-                WHERE v.colegio_id = :cid AND f.nombre = :fname
-                GROUP BY v.nombre
-                ORDER BY total_puntos DESC
-            """)
-            with engine.connect() as conn:
-                df_valores = pd.read_sql(q_valores, conn, params={"cid": colegio_id, "fname": frat_sel})
+            df_valores = leer_puntos_fraternidad_por_valor(colegio_id, frat_sel, version_datos(colegio_id))
 
             if not df_valores.empty:
                 st.dataframe(df_valores, use_container_width=True, hide_index=True)
-                fig, ax = plt.subplots(figsize=(6,3))
+                fig, ax = nueva_figura()
                 df_valores.plot(kind="bar", x="valor", y="total_puntos", ax=ax, legend=False)
                 ax.set_ylabel("Puntos")
                 ax.set_title(f"Distribución de valores - {frat_sel}")
@@ -624,7 +1262,7 @@ with tabs[3]:
                 else:
                     frat_id = str(frats.loc[frats["nombre"] == fraternidad_prof, "id"].iloc[0]) if not frats.empty else None
                     try:
-                        user_resp = supabase.auth.admin.create_user({
+                        user_resp = get_supabase().auth.admin.create_user({
                             "email": email_prof,
                             "password": cedula_prof,
                             "email_confirm": True
@@ -676,7 +1314,7 @@ with tabs[3]:
                         if not prof:
                             st.error("❌ No existe un profesor con esa cédula en este colegio.")
                         else:
-                            supabase.auth.admin.update_user_by_id(
+                            get_supabase().auth.admin.update_user_by_id(
                                 str(prof.auth_id),
                                 {"password": str(prof.cedula)}
                             )
@@ -699,7 +1337,7 @@ with tabs[3]:
                 st.warning("⚠️ Ingresa email del profesor.")
             else:
                 try:
-                    supabase.auth.sign_in_with_otp({
+                    get_supabase().auth.sign_in_with_otp({
                         "email": email_magic,
                         "options": {
                             "email_redirect_to": "https://resethogwartz.streamlit.app/"
@@ -796,7 +1434,7 @@ with tabs[3]:
                         cambios_auth["password"] = cedula_n   # 👈 clave inicial = cédula
 
                     if cambios_auth:
-                        supabase.auth.admin.update_user_by_id(auth_id, cambios_auth)
+                        get_supabase().auth.admin.update_user_by_id(auth_id, cambios_auth)
 
                     if result.rowcount == 0:
                         st.warning("⚠️ No se actualizó ningún registro (¿ID o colegio no coinciden?).")
@@ -807,5 +1445,85 @@ with tabs[3]:
                 except Exception as e:
                     st.error(f"❌ Error al actualizar profesor: {e}")
 
+        # ===================================
+        # 📈 Actividad de profesores
+        # ===================================
+        st.subheader("📈 Actividad de profesores")
+        semanas = st.selectbox("Periodo", [4, 12, 52], index=1,
+                               format_func=lambda n: f"Últimas {n} semanas", key="actividad_semanas")
+        actividad = leer_actividad_profesores(colegio_id, semanas)
+
+        if actividad.empty:
+            st.info("ℹ️ No hay puntos asignados en este periodo.")
+        else:
+            resumen_prof = (actividad.groupby("profesor", as_index=False)
+                            .agg(asignaciones=("asignaciones", "sum"),
+                                 total_puntos=("total_puntos", "sum"),
+                                 semanas_activas=("semana", "nunique"))
+                            .sort_values("asignaciones", ascending=False))
+            st.dataframe(resumen_prof, use_container_width=True, hide_index=True)
+
+            st.markdown("**Puntos otorgados por fraternidad**")
+            por_frat = actividad.pivot_table(index="profesor", columns="fraternidad",
+                                             values="total_puntos", aggfunc="sum", fill_value=0)
+            st.dataframe(por_frat, use_container_width=True)
+
+            st.markdown("**Puntos otorgados por valor**")
+            por_valor = actividad.pivot_table(index="profesor", columns="valor",
+                                              values="total_puntos", aggfunc="sum", fill_value=0)
+            st.dataframe(por_valor, use_container_width=True)
+
+            semanal = actividad.pivot_table(index="semana", columns="fraternidad",
+                                            values="asignaciones", aggfunc="sum", fill_value=0)
+            fig, ax = nueva_figura()
+            semanal.plot(kind="line", marker="o", ax=ax)
+            ax.set_ylabel("Asignaciones")
+            ax.set_title("Asignaciones semanales por fraternidad")
+            st.pyplot(fig)
+
 
+# ---- TAB 5: Mis asignaciones ----
+with tabs[4]:
+    st.header("🧾 Puntos que he asignado")
+    mostrar_historial("historial_profesor", "profesor", profesor_id,
+                      ["fecha", "estudiante", "grado", "valor", "cantidad"])
 
+
+# ---- TAB 6: Red de colegios (solo admin_red) ----
+if rol == "admin_red":
+    with tabs[5]:
+        st.header("🌐 Comparativa de la red de colegios")
+        colegios = leer_colegios()
+
+        if colegios.empty:
+            st.info("ℹ️ No hay colegios registrados.")
+        else:
+            semanas_red = st.selectbox("Periodo", [4, 12, 52], index=1,
+                                       format_func=lambda n: f"Últimas {n} semanas", key="red_semanas")
+            hilos = hilos_red(len(colegios))
+            t0 = time.perf_counter()
+            resultados = calcular_red(colegios, semanas_red, hilos)
+            total_s = time.perf_counter() - t0
+
+            filas, leaderboards = [], []
+            for nombre, metricas, leaderboard, _ in resultados:
+                lider = leaderboard.iloc[0]["fraternidad"] if not leaderboard.empty else "-"
+                filas.append({"colegio": nombre, **metricas, "fraternidad_lider": lider})
+                leaderboards.append(leaderboard.assign(colegio=nombre))
+
+            resumen_red = pd.DataFrame(filas)
+            resumen_red["puntos_por_estudiante"] = (
+                resumen_red["puntos_otorgados"] / resumen_red["estudiantes"].where(resumen_red["estudiantes"] > 0)
+            ).fillna(0).round(1)
+            st.dataframe(resumen_red.sort_values("puntos_otorgados", ascending=False),
+                         use_container_width=True, hide_index=True)
+
+            st.subheader(f"🏆 Leaderboards por colegio (últimas {semanas_red} semanas)")
+            tabla_frats = (pd.concat(leaderboards, ignore_index=True)
+                           .pivot_table(index="colegio", columns="fraternidad", values="total_puntos",
+                                        aggfunc="sum", fill_value=0))
+            st.dataframe(tabla_frats, use_container_width=True)
+
+            mas_lento = max(r[3] for r in resultados)
+            st.caption(f"⏱️ {len(resultados)} colegios en {total_s:.2f}s "
+                       f"(colegio más lento: {mas_lento:.2f}s, {hilos} hilos)")
@@ -0,0 +1,129 @@
+import argparse
+import ast
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# =========================
+# ⏱️ Benchmark de arranque en frío
+# =========================
+# Cada medición corre en un intérprete nuevo, como un contenedor recién creado:
+#   - import_s: tiempo de ejecutar los imports de nivel superior del script
+#     que se alcanzan antes de la primera pantalla: se corta en el primer
+#     bloque con st.stop() (el login); lo que se importa después no cuenta.
+#   - render_s: tiempo de la primera ejecución completa del script con AppTest
+#     (lo que tarda el usuario en ver la primera pantalla, p. ej. el login).
+# Los secretos se leen de .streamlit/secrets.toml o de --secrets.
+#
+#   python bench_startup.py                       # todas las apps
+#   python bench_startup.py app.py --max-render 2.5
+
+RAIZ = Path(__file__).resolve().parent
+ENTRADAS = ["app.py", "hogwarts_estudiantes.py", "onboarding.py"]
+
+PRESUPUESTO_IMPORT_S = 1.5
+PRESUPUESTO_RENDER_S = 3.0
+
+
+def _es_st_stop(nodo) -> bool:
+    return (isinstance(nodo, ast.Call) and isinstance(nodo.func, ast.Attribute)
+            and nodo.func.attr == "stop" and isinstance(nodo.func.value, ast.Name)
+            and nodo.func.value.id == "st")
+
+
+def imports_de_nivel_superior(script: Path) -> str:
+    arbol = ast.parse(script.read_text(encoding="utf-8"))
+    nodos = []
+    for nodo in arbol.body:
+        if isinstance(nodo, (ast.Import, ast.ImportFrom)):
+            nodos.append(nodo)
+        elif not isinstance(nodo, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) \
+                and any(_es_st_stop(n) for n in ast.walk(nodo)):
+            break  # compuerta del login: lo que sigue no se carga en la primera pantalla
+    return ast.unparse(ast.Module(body=nodos, type_ignores=[]))
+
+
+def medir_import(script: Path) -> float:
+    codigo = imports_de_nivel_superior(script)
+    t0 = time.perf_counter()
+    exec(compile(codigo, str(script), "exec"), {})
+    return time.perf_counter() - t0
+
+
+def medir_render(script: Path, secretos: str | None, timeout: float) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(str(script), default_timeout=timeout)
+    if secretos:
+        import tomllib
+        with open(secretos, "rb") as f:
+            for k, v in tomllib.load(f).items():
+                at.secrets[k] = v
+
+    t0 = time.perf_counter()
+    at.run()
+    render_s = time.perf_counter() - t0
+    return {"render_s": render_s, "errores": [e.value for e in at.exception]}
+
+
+def medir_en_proceso_nuevo(script: str, modo: str, args) -> dict:
+    cmd = [sys.executable, __file__, "--medir", modo, script, "--timeout", str(args.timeout)]
+    if args.secrets:
+        cmd += ["--secrets", args.secrets]
+    salida = subprocess.run(cmd, cwd=RAIZ, capture_output=True, text=True, check=True)
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de arranque en frío de las apps Streamlit")
+    parser.add_argument("scripts", nargs="*", default=ENTRADAS)
+    parser.add_argument("--max-import", type=float, default=PRESUPUESTO_IMPORT_S,
+                        help="presupuesto de imports por script, en segundos")
+    parser.add_argument("--max-render", type=float, default=PRESUPUESTO_RENDER_S,
+                        help="presupuesto del primer render por script, en segundos")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--secrets", help="archivo TOML con los secretos de la app")
+    parser.add_argument("--medir", choices=["import", "render"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        script = RAIZ / args.scripts[0]
+        if args.medir == "import":
+            resultado = {"import_s": medir_import(script)}
+        else:
+            resultado = medir_render(script, args.secrets, args.timeout)
+        print(json.dumps(resultado))
+        return 0
+
+    fallas = []
+    print(f"{'script':<28}{'import (s)':>12}{'render (s)':>12}")
+    for script in args.scripts:
+        # La mediana de varias corridas en frío aísla el ruido del disco.
+        imports = sorted(medir_en_proceso_nuevo(script, "import", args)["import_s"]
+                         for _ in range(args.repeticiones))
+        renders = [medir_en_proceso_nuevo(script, "render", args) for _ in range(args.repeticiones)]
+        import_s = imports[len(imports) // 2]
+        render_s = sorted(r["render_s"] for r in renders)[len(renders) // 2]
+        print(f"{script:<28}{import_s:>12.3f}{render_s:>12.3f}")
+
+        if import_s > args.max_import:
+            fallas.append(f"{script}: imports {import_s:.3f}s > {args.max_import:.3f}s")
+        if render_s > args.max_render:
+            fallas.append(f"{script}: primer render {render_s:.3f}s > {args.max_render:.3f}s")
+        for error in {e for r in renders for e in r["errores"]}:
+            fallas.append(f"{script}: excepción al renderizar: {error}")
+
+    if fallas:
+        print("\n❌ Presupuesto de arranque excedido:")
+        for f in fallas:
+            print(f"  - {f}")
+        return 1
+    print("\n✅ Dentro del presupuesto de arranque.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
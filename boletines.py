@@ -0,0 +1,213 @@
+import argparse
+import io
+import re
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+# =========================
+# 🗂️ Boletines por lote
+# =========================
+# Una sola consulta trae el resumen de todo el colegio (para calcular puestos);
+# cada boletín se dibuja en un proceso aparte y el proceso principal solo
+# arma el zip. Los procesos arrancan con "spawn": el servidor de Streamlit
+# tiene hilos vivos y hacer fork de él no es seguro (ver ejecutar_lote).
+# pandas y sqlalchemy se importan dentro de las funciones de datos para que
+# los procesos de dibujo solo carguen matplotlib.
+
+FORMATOS = ["pdf", "png"]
+
+
+def _texto(valor, vacio=""):
+    import pandas as pd
+    return vacio if pd.isna(valor) else str(valor)
+
+
+def leer_datos_boletines(engine, colegio_id):
+    import pandas as pd
+    from sqlalchemy import text
+
+    q = text("SELECT * FROM resumen_puntos_estudiantes WHERE colegio_id = :cid")
+    with engine.connect() as conn:
+        df = pd.read_sql(q, conn, params={"cid": str(colegio_id)})
+    df.columns = df.columns.str.lower()
+    df["puntos"] = pd.to_numeric(df["puntos"], errors="coerce").fillna(0).astype(int)
+    return df
+
+
+def preparar_boletines(df, grado: str = None, seccion: str = None) -> list:
+    if df.empty:
+        return []
+    # El resumen cacheado de la app viene con categorías; aquí basta texto.
+    df = df.astype({c: object for c in df.select_dtypes("category").columns})
+
+    perfil = ["estudiante_id", "codigo", "nombre", "apellidos", "grado", "fraternidad", "colegio"]
+    por_valor = df.pivot_table(index="estudiante_id", columns="valor", values="puntos",
+                               aggfunc="sum", fill_value=0)
+    alumnos = (df.drop_duplicates(subset=["estudiante_id"])[perfil]
+               .set_index("estudiante_id")
+               .join(por_valor.sum(axis=1).rename("total")))
+
+    # Puestos sobre el colegio completo y dentro del grado exacto (ej: 6A).
+    alumnos["puesto_colegio"] = alumnos["total"].rank(ascending=False, method="min").astype(int)
+    alumnos["puesto_grado"] = (alumnos.groupby("grado", dropna=False)["total"]
+                               .rank(ascending=False, method="min").astype(int))
+    alumnos["en_grado"] = alumnos.groupby("grado", dropna=False)["total"].transform("size")
+    alumnos["en_colegio"] = len(alumnos)
+
+    grados = alumnos["grado"].fillna("").astype(str).str.strip()
+    if grado:
+        objetivo = f"{grado}{seccion or ''}"
+        alumnos = alumnos[grados.str.fullmatch(rf"{re.escape(objetivo)}[A-Za-z]?" if not seccion
+                                               else re.escape(objetivo))]
+
+    alumnos = alumnos.sort_values(["grado", "apellidos", "nombre"], na_position="last")
+    boletines = []
+    for est_id, r in alumnos.iterrows():
+        valores = por_valor.loc[est_id]
+        boletines.append({
+            "id": str(est_id),
+            "codigo": _texto(r["codigo"]),
+            "nombre": _texto(r["nombre"]),
+            "apellidos": _texto(r["apellidos"]),
+            "grado": _texto(r["grado"]),
+            "fraternidad": _texto(r["fraternidad"], "-"),
+            "colegio": _texto(r["colegio"]),
+            "valores": [(str(v), int(p)) for v, p in valores.items()],
+            "total": int(r["total"]),
+            "puesto_grado": int(r["puesto_grado"]),
+            "en_grado": int(r["en_grado"]),
+            "puesto_colegio": int(r["puesto_colegio"]),
+            "en_colegio": int(r["en_colegio"]),
+        })
+    return boletines
+
+
+def nombre_archivo(b: dict, formato: str) -> str:
+    # El prefijo del id separa a homónimos del mismo grado sin código: en el
+    # zip, dos entradas con el mismo nombre dejan solo una al descomprimir.
+    base = f"{b['grado']}_{b['apellidos']}_{b['nombre']}_{b['codigo']}".strip("_")
+    base = f"{base}_{b['id'][:8]}"
+    return re.sub(r"[^\w.-]+", "_", base) + f".{formato}"
+
+
+def renderizar_boletin(b: dict, formato: str = "pdf"):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig = plt.figure(figsize=(8.27, 11.69))  # A4 vertical
+    fig.text(0.08, 0.94, f"{b['nombre']} {b['apellidos']}", fontsize=20, weight="bold")
+    perfil = [
+        f"Código: {b['codigo'] or '-'}",
+        f"Grado: {b['grado']}    Fraternidad: {b['fraternidad']}",
+        f"Colegio: {b['colegio']}",
+        f"Total de puntos: {b['total']}",
+        f"Puesto en el grado: {b['puesto_grado']} de {b['en_grado']}    "
+        f"Puesto en el colegio: {b['puesto_colegio']} de {b['en_colegio']}",
+    ]
+    for i, linea in enumerate(perfil):
+        fig.text(0.08, 0.90 - i * 0.025, linea, fontsize=11)
+
+    ax_tabla = fig.add_axes([0.08, 0.50, 0.84, 0.25])
+    ax_tabla.axis("off")
+    if b["valores"]:
+        tabla = ax_tabla.table(cellText=[[v, p] for v, p in b["valores"]],
+                               colLabels=["Valor", "Puntos"], loc="upper center", cellLoc="left")
+        tabla.scale(1, 1.4)
+
+    ax = fig.add_axes([0.10, 0.08, 0.82, 0.36])
+    ax.bar([v for v, _ in b["valores"]], [p for _, p in b["valores"]], color="skyblue")
+    ax.set_ylabel("Puntos")
+    ax.set_title("Distribución de valores")
+    plt.setp(ax.get_xticklabels(), rotation=30, ha="right")
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format=formato, dpi=100)
+    plt.close(fig)
+    return nombre_archivo(b, formato), buf.getvalue()
+
+
+def generar_boletines(boletines: list, formato: str = "pdf", procesos: int = None, al_avanzar=None) -> bytes:
+    # al_avanzar(hechos, total, boletines_por_segundo) se llama en el proceso principal.
+    buf = io.BytesIO()
+    t0 = time.perf_counter()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf, \
+            ProcessPoolExecutor(max_workers=procesos, mp_context=get_context("spawn")) as pool:
+        futuros = [pool.submit(renderizar_boletin, b, formato) for b in boletines]
+        for hechos, futuro in enumerate(as_completed(futuros), start=1):
+            nombre, contenido = futuro.result()
+            zf.writestr(nombre, contenido)
+            if al_avanzar:
+                al_avanzar(hechos, len(boletines), hechos / max(time.perf_counter() - t0, 1e-9))
+    return buf.getvalue()
+
+
+def ejecutar_lote(boletines: list, formato: str = "pdf", procesos: int = None, al_avanzar=None) -> bytes:
+    # Desde Streamlit el pool corre en un proceso hijo propio: Streamlit ejecuta
+    # app.py como __main__ y "spawn" volvería a ejecutar la app en cada proceso.
+    import json
+    import subprocess
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        salida = f"{tmp}/boletines.zip"
+        cmd = [sys.executable, __file__, "--stdin", "--formato", formato, "--salida", salida]
+        if procesos:
+            cmd += ["--procesos", str(procesos)]
+        # stderr va a un archivo: si fuera un pipe que solo se lee al final, un
+        # hijo que escribe mucho (avisos, tracebacks de los workers) se
+        # bloquearía al llenarlo y la página quedaría esperando para siempre.
+        with open(f"{tmp}/errores.log", "w+") as errores, \
+                subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                 stderr=errores, text=True) as proc:
+            proc.stdin.write(json.dumps(boletines))
+            proc.stdin.close()
+            for linea in proc.stdout:
+                hechos, total, por_segundo = linea.split()
+                if al_avanzar:
+                    al_avanzar(int(hechos), int(total), float(por_segundo))
+            proc.wait()
+            errores.seek(0)
+            detalle = errores.read()
+        if proc.returncode != 0:
+            raise RuntimeError(f"Falló la generación de boletines: {detalle.strip()[-4000:]}")
+        with open(salida, "rb") as f:
+            return f.read()
+
+
+if __name__ == "__main__":
+    # python boletines.py postgresql://... <colegio_id> [--grado 6 --seccion A] --salida boletines.zip
+    import json
+
+    parser = argparse.ArgumentParser(description="Genera boletines de puntos por lote")
+    parser.add_argument("db_url", nargs="?")
+    parser.add_argument("colegio_id", nargs="?")
+    parser.add_argument("--grado")
+    parser.add_argument("--seccion")
+    parser.add_argument("--formato", choices=FORMATOS, default="pdf")
+    parser.add_argument("--procesos", type=int)
+    parser.add_argument("--salida", default="boletines.zip")
+    parser.add_argument("--stdin", action="store_true", help="lee los boletines ya preparados (JSON) de stdin")
+    args = parser.parse_args()
+
+    if args.stdin:
+        lote = json.load(sys.stdin)
+
+        def mostrar(hechos, total, por_segundo):
+            print(hechos, total, f"{por_segundo:.3f}", flush=True)
+    else:
+        from sqlalchemy import create_engine
+
+        datos = leer_datos_boletines(create_engine(args.db_url), args.colegio_id)
+        lote = preparar_boletines(datos, args.grado, args.seccion)
+
+        def mostrar(hechos, total, por_segundo):
+            print(f"\r{hechos}/{total} boletines · {por_segundo:.1f}/s", end="", file=sys.stderr)
+
+    with open(args.salida, "wb") as f:
+        f.write(generar_boletines(lote, args.formato, args.procesos, mostrar))
+    if not args.stdin:
+        print(f"\n✅ {len(lote)} boletines en {args.salida}", file=sys.stderr)
@@ -0,0 +1,126 @@
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin candado entre procesos
+    fcntl = None
+
+# =========================
+# 💽 Cache compartido en disco (segundo nivel)
+# =========================
+# st.cache_data vive en la memoria de cada proceso. Cuando hay varias réplicas
+# en el mismo servidor, o después de un redeploy, cada proceso cargaría de
+# nuevo los mismos resúmenes desde Postgres. Este cache guarda esos resultados
+# en un SQLite local que comparten todos los procesos del host:
+#   - cada entrada lleva un sello (la versión del colegio en versiones_colegio);
+#     si el sello no coincide, la entrada no sirve y se vuelve a cargar;
+#   - un solo proceso carga cada entrada que falta: los demás esperan el
+#     candado del archivo y luego la leen del disco (single-flight).
+# Solo debe guardar datos de la propia app: se deserializa con pickle.
+#
+# Se activa con CACHE_DISCO = "/ruta/cache.sqlite" en los secrets.
+
+log = logging.getLogger(__name__)
+
+ESPERA_CANDADO_S = 30.0
+
+
+class CacheDisco:
+    def __init__(self, ruta, espera_candado_s: float = ESPERA_CANDADO_S):
+        self.ruta = Path(ruta)
+        self.candados = self.ruta.with_name(self.ruta.name + ".candados")
+        self.espera_candado_s = espera_candado_s
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        self.candados.mkdir(exist_ok=True)
+        with self._conectar() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS entradas (
+                    clave   TEXT PRIMARY KEY,
+                    sello   TEXT NOT NULL,
+                    datos   BLOB NOT NULL,
+                    creada  REAL NOT NULL
+                )
+            """)
+
+    def _conectar(self):
+        # Una conexión por llamada: sqlite3 no comparte conexiones entre hilos.
+        db = sqlite3.connect(self.ruta, timeout=10, isolation_level=None)
+        db.execute("PRAGMA busy_timeout=10000")
+        return db
+
+    def leer(self, clave: str, sello, max_edad_s: float = None):
+        # Devuelve (encontrado, valor).
+        db = self._conectar()
+        try:
+            fila = db.execute("SELECT sello, datos, creada FROM entradas WHERE clave = ?", (clave,)).fetchone()
+        finally:
+            db.close()
+        if fila is None or fila[0] != str(sello):
+            return False, None
+        if max_edad_s is not None and time.time() - fila[2] > max_edad_s:
+            return False, None
+        return True, pickle.loads(fila[1])
+
+    def guardar(self, clave: str, sello, valor) -> None:
+        datos = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+        db = self._conectar()
+        try:
+            db.execute("INSERT OR REPLACE INTO entradas (clave, sello, datos, creada) VALUES (?, ?, ?, ?)",
+                       (clave, str(sello), datos, time.time()))
+        finally:
+            db.close()
+
+    def obtener(self, clave: str, sello, cargar, max_edad_s: float = None):
+        encontrado, valor = self.leer(clave, sello, max_edad_s)
+        if encontrado:
+            return valor
+        with self._candado(clave):
+            # Mientras esperábamos, otro proceso pudo haberla cargado.
+            encontrado, valor = self.leer(clave, sello, max_edad_s)
+            if encontrado:
+                return valor
+            valor = cargar()
+            try:
+                self.guardar(clave, sello, valor)
+            except Exception:
+                log.exception("No se pudo guardar %s en el cache en disco", clave)
+            return valor
+
+    def limpiar(self) -> None:
+        db = self._conectar()
+        try:
+            db.execute("DELETE FROM entradas")
+        finally:
+            db.close()
+
+    @contextmanager
+    def _candado(self, clave: str):
+        if fcntl is None:
+            yield
+            return
+        nombre = hashlib.sha1(clave.encode("utf-8")).hexdigest() + ".lock"
+        fd = os.open(self.candados / nombre, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            limite = time.monotonic() + self.espera_candado_s
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() > limite:
+                        # Si quien carga se colgó, mejor cargar que bloquear la página.
+                        log.warning("Candado de %s ocupado por más de %.0fs; se carga sin esperar",
+                                    clave, self.espera_candado_s)
+                        break
+                    time.sleep(0.05)
+            yield
+        finally:
+            os.close(fd)  # libera el candado
@@ -0,0 +1,476 @@
+import argparse
+import random
+import sys
+import threading
+import time
+import tomllib
+import types
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+# =========================
+# 🧪 Prueba de carga: muchos profesores a la vez
+# =========================
+# Simula N sesiones de app.py dentro de un mismo proceso (como el servidor de
+# Streamlit: un hilo por sesión, un solo pool de conexiones compartido) y las
+# pone a hacer clics al mismo tiempo con una mezcla de acciones:
+#   busqueda    -> elegir varios estudiantes en la búsqueda múltiple
+#   detalle     -> abrir el detalle de un estudiante
+#   individual  -> asignar puntos desde el detalle
+#   masiva      -> asignar puntos a los seleccionados en la búsqueda múltiple
+#   fraternidad -> asignar puntos a toda una fraternidad
+# Cada acción es una re-ejecución completa del script, igual que un clic real.
+# El login usa un Supabase falso: cualquier contraseña entra con el correo
+# dado, y el correo debe existir en la tabla profesores.
+#
+#   python carga_profesores.py --secrets carga.toml --sembrar
+#   python carga_profesores.py --secrets carga.toml --sesiones 60 --duracion 60 --pausa 0
+#
+# Usa siempre una base Postgres local y desechable: las acciones escriben puntos.
+#
+# Para correr varias sesiones de AppTest en hilos se fija estado interno de
+# Streamlit (ver streamlit_compartido), probado solo con las versiones de
+# VERSIONES_PROBADAS; con otras la prueba se niega a correr salvo --forzar.
+
+RAIZ = Path(__file__).resolve().parent
+APP = RAIZ / "app.py"
+
+MEZCLA = {"busqueda": 30, "detalle": 30, "individual": 20, "masiva": 12, "fraternidad": 8}
+
+BOTON_LOGIN = "Iniciar sesión"
+BOTON_INDIVIDUAL = "Actualizar puntos"
+BOTON_MASIVA = "Asignar puntos a seleccionados (texto)"
+BOTON_FRATERNIDAD = "Asignar puntos a toda la fraternidad"
+
+VERSIONES_PROBADAS = {"streamlit": "1.66.", "sqlalchemy": "2.1."}
+
+
+def versiones_distintas() -> list:
+    import sqlalchemy
+    import streamlit
+
+    instaladas = {"streamlit": streamlit.__version__, "sqlalchemy": sqlalchemy.__version__}
+    return [f"{nombre} {instaladas[nombre]} (probado con {prefijo}x)"
+            for nombre, prefijo in VERSIONES_PROBADAS.items()
+            if not instaladas[nombre].startswith(prefijo)]
+
+
+def leer_secretos(ruta: str | None) -> dict:
+    ruta = Path(ruta) if ruta else RAIZ / ".streamlit" / "secrets.toml"
+    with open(ruta, "rb") as f:
+        secretos = tomllib.load(f)
+    # El Supabase falso no se conecta a nada, pero la app lee las llaves.
+    secretos.setdefault("SUPABASE_URL", "http://supabase.falso")
+    secretos.setdefault("SUPABASE_KEY", "falso")
+    return secretos
+
+
+def url_de(secretos: dict) -> str:
+    return (f"postgresql://{secretos['DB_USER']}:{secretos['DB_PASS']}@"
+            f"{secretos['DB_HOST']}:{secretos['DB_PORT']}/{secretos['DB_NAME']}")
+
+
+# -------------------------
+# Supabase falso
+# -------------------------
+class AuthFalsa:
+    def sign_in_with_password(self, credenciales: dict):
+        usuario = types.SimpleNamespace(email=credenciales["email"], id=f"falso-{credenciales['email']}")
+        return types.SimpleNamespace(user=usuario, session=None)
+
+    def update_user(self, cambios: dict):
+        return None
+
+    def sign_out(self):
+        return None
+
+
+@contextmanager
+def supabase_falso():
+    modulo = types.ModuleType("supabase")
+    modulo.ClientOptions = types.SimpleNamespace
+    modulo.create_client = lambda url, key, options=None: types.SimpleNamespace(auth=AuthFalsa())
+    anterior = sys.modules.get("supabase")
+    sys.modules["supabase"] = modulo
+    try:
+        yield
+    finally:
+        if anterior is None:
+            sys.modules.pop("supabase", None)
+        else:
+            sys.modules["supabase"] = anterior
+
+
+# -------------------------
+# Streamlit con varias sesiones en hilos
+# -------------------------
+@contextmanager
+def streamlit_compartido(secretos: dict):
+    # AppTest pone y quita estado global (Runtime, st.secrets, config) en cada
+    # corrida. Con varias sesiones en paralelo, la que termina primero se lo
+    # quitaría a las que siguen corriendo; aquí se fija una sola vez y se
+    # devuelve tal cual al salir. Toca internos de Streamlit: ver
+    # VERSIONES_PROBADAS.
+    import streamlit as st
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.runtime.secrets import Secrets
+
+    originales = {
+        "secrets": st.secrets,
+        "app_test": config.get_option("global.appTest"),
+        "instance": Runtime.__dict__["instance"],
+        "exists": Runtime.__dict__["exists"],
+        "get_bytecode": ScriptCache.__dict__["get_bytecode"],
+    }
+
+    globales = Secrets()
+    globales._secrets = secretos
+    st.secrets = globales
+    config.set_option("global.appTest", True)
+
+    ultimo = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            ultimo["runtime"] = cls._instance
+        return ultimo["runtime"]
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: "runtime" in ultimo or cls._instance is not None)
+
+    # Como en el servidor, el script se compila una sola vez para todas las
+    # sesiones (compilarlo en varios hilos a la vez falla en CPython 3.11).
+    compartida = ScriptCache()
+    compilar = originales["get_bytecode"]
+    ScriptCache.get_bytecode = lambda self, ruta: compilar(compartida, ruta)
+    try:
+        yield
+    finally:
+        st.secrets = originales["secrets"]
+        config.set_option("global.appTest", originales["app_test"])
+        Runtime.instance = originales["instance"]
+        Runtime.exists = originales["exists"]
+        ScriptCache.get_bytecode = originales["get_bytecode"]
+
+
+class MedidorPool:
+    # Solo con eventos públicos de SQLAlchemy (se quitan al salir del with):
+    #   checkout/checkin    -> conexiones en uso a la vez y cuánto retiene
+    #                          cada una; si se retienen mucho, las demás
+    #                          sesiones esperan.
+    #   do_connect/connect  -> cuánto cuesta abrir una conexión nueva.
+    # SQLAlchemy no tiene un evento antes de pedir una conexión al pool, así
+    # que la espera en la cola se ve como "pool lleno": veces que una sesión
+    # se llevó la última conexión libre (la siguiente tuvo que esperar).
+    def __init__(self, capacidad: int):
+        self.capacidad = capacidad
+        self.retenidas = []
+        self.conexiones_nuevas = []
+        self.en_uso = 0
+        self.max_en_uso = 0
+        self.lleno = 0
+        self._desde = {}
+        self._abriendo = threading.local()
+        self._lock = threading.Lock()
+
+    def _checkout(self, dbapi_con, registro, proxy):
+        with self._lock:
+            self.en_uso += 1
+            self.max_en_uso = max(self.max_en_uso, self.en_uso)
+            if self.en_uso >= self.capacidad:
+                self.lleno += 1
+            self._desde[id(registro)] = time.perf_counter()
+
+    def _checkin(self, dbapi_con, registro):
+        with self._lock:
+            self.en_uso -= 1
+            desde = self._desde.pop(id(registro), None)
+            if desde is not None:
+                self.retenidas.append(time.perf_counter() - desde)
+
+    def _do_connect(self, dialect, registro, cargs, cparams):
+        self._abriendo.desde = time.perf_counter()
+
+    def _connect(self, dbapi_con, registro):
+        desde = getattr(self._abriendo, "desde", None)
+        if desde is not None:
+            with self._lock:
+                self.conexiones_nuevas.append(time.perf_counter() - desde)
+
+    def __enter__(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        from sqlalchemy.pool import Pool
+
+        self._escuchas = [(Pool, "checkout", self._checkout), (Pool, "checkin", self._checkin),
+                          (Engine, "do_connect", self._do_connect), (Pool, "connect", self._connect)]
+        for objetivo, nombre, funcion in self._escuchas:
+            event.listen(objetivo, nombre, funcion)
+        return self
+
+    def __exit__(self, *_):
+        from sqlalchemy import event
+
+        for objetivo, nombre, funcion in self._escuchas:
+            event.remove(objetivo, nombre, funcion)
+
+
+def capacidad_pool() -> int:
+    # app.py crea su engine con los valores por defecto de QueuePool.
+    import inspect
+    from sqlalchemy.pool import QueuePool
+
+    parametros = inspect.signature(QueuePool).parameters
+    return parametros["pool_size"].default + parametros["max_overflow"].default
+
+
+# -------------------------
+# Sesión simulada
+# -------------------------
+class Sesion:
+    def __init__(self, email: str, resultados, timeout: float, semilla: int):
+        from streamlit.testing.v1 import AppTest
+
+        self.email = email
+        self.resultados = resultados
+        self.at = AppTest.from_file(str(APP), default_timeout=timeout)
+        self.azar = random.Random(semilla)
+
+    def _boton(self, etiqueta: str):
+        return next((b for b in self.at.button if b.label == etiqueta), None)
+
+    def _widget(self, tipo: str, clave: str):
+        return next((w for w in getattr(self.at, tipo) if w.key == clave), None)
+
+    def _correr(self, accion: str) -> None:
+        t0 = time.perf_counter()
+        errores = []
+        try:
+            self.at.run()
+            errores = [str(e.value) for e in self.at.exception] + [e.value for e in self.at.error]
+        except Exception as e:
+            errores = [f"{type(e).__name__}: {e}"]
+        self.resultados.registrar(accion, time.perf_counter() - t0, errores)
+
+    def login(self) -> None:
+        self.at.run()
+        self.at.sidebar.text_input[0].input(self.email)
+        self.at.sidebar.text_input[1].input("carga")
+        next(b for b in self.at.sidebar.button if b.label == BOTON_LOGIN).click()
+        self._correr("login")
+
+    def busqueda(self, cuantos: int = 3) -> bool:
+        multi = self._widget("multiselect", "busqueda_texto_multi")
+        if multi is None or not multi.options:
+            return False
+        multi.set_value(self.azar.sample(multi.options, min(cuantos, len(multi.options))))
+        self._correr("busqueda")
+        return True
+
+    def detalle(self) -> bool:
+        individual = self._widget("selectbox", "busqueda_individual")
+        if individual is None or len(individual.options) < 2:
+            return False
+        individual.select_index(self.azar.randrange(1, len(individual.options)))
+        self._correr("detalle")
+        return True
+
+    def individual(self) -> bool:
+        if self._boton(BOTON_INDIVIDUAL) is None and not self.detalle():
+            return False
+        boton = self._boton(BOTON_INDIVIDUAL)
+        if boton is None:
+            return False
+        boton.click()
+        self._correr("individual")
+        return True
+
+    def masiva(self) -> bool:
+        if self._boton(BOTON_MASIVA) is None and not self.busqueda(self.azar.randint(5, 15)):
+            return False
+        boton = self._boton(BOTON_MASIVA)
+        if boton is None:
+            return False
+        boton.click()
+        self._correr("masiva")
+        return True
+
+    def fraternidad(self) -> bool:
+        frat = self._widget("selectbox", "frat_asignar")
+        boton = self._boton(BOTON_FRATERNIDAD)
+        if frat is None or boton is None:
+            return False
+        frat.select_index(self.azar.randrange(len(frat.options)))
+        boton.click()
+        self._correr("fraternidad")
+        return True
+
+    def recorrer(self, mezcla: dict, hasta: float, pausa: float) -> None:
+        acciones, pesos = list(mezcla), list(mezcla.values())
+        while time.monotonic() < hasta:
+            accion = self.azar.choices(acciones, pesos)[0]
+            if not getattr(self, accion)():
+                # No es una falla de la app: la pantalla de esta sesión no la ofrece.
+                self.resultados.omitir(accion)
+                self._correr("recarga")
+            if pausa:
+                time.sleep(self.azar.uniform(0, pausa))
+
+
+class Resultados:
+    def __init__(self):
+        self.latencias = defaultdict(list)
+        self.errores = defaultdict(list)
+        self.omitidas = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def registrar(self, accion: str, segundos: float, errores: list) -> None:
+        with self._lock:
+            if errores:
+                self.errores[accion].extend(errores)
+            else:
+                self.latencias[accion].append(segundos)
+
+    def omitir(self, accion: str) -> None:
+        with self._lock:
+            self.omitidas[accion] += 1
+
+
+def percentil(valores: list, p: float) -> float:
+    if not valores:
+        return float("nan")
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados) + 0.5) - 1))]
+
+
+def profesores_de_prueba(engine, colegio_id: str | None) -> list:
+    from sqlalchemy import text
+
+    with engine.connect() as conn:
+        if not colegio_id:
+            colegio_id = conn.execute(text("""
+                SELECT colegio_id FROM profesores
+                WHERE rol IN ('profesor', 'director')
+                GROUP BY colegio_id ORDER BY count(*) DESC LIMIT 1
+            """)).scalar()
+        filas = conn.execute(text("""
+            SELECT email FROM profesores
+            WHERE colegio_id = :cid AND rol IN ('profesor', 'director') AND email IS NOT NULL
+            ORDER BY email
+        """), {"cid": str(colegio_id)}).fetchall()
+    return [f[0] for f in filas]
+
+
+def interpretar_mezcla(texto: str) -> dict:
+    mezcla = {}
+    for parte in texto.split(","):
+        accion, _, peso = parte.partition("=")
+        if accion.strip() not in MEZCLA:
+            raise argparse.ArgumentTypeError(f"acción desconocida: {accion}")
+        mezcla[accion.strip()] = float(peso)
+    return mezcla
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga con muchos profesores a la vez")
+    parser.add_argument("--secrets", help="TOML con DB_* de una base local (por defecto .streamlit/secrets.toml)")
+    parser.add_argument("--sesiones", type=int, default=60)
+    parser.add_argument("--duracion", type=float, default=60, help="segundos de clics después del login")
+    parser.add_argument("--pausa", type=float, default=2.0, help="pausa máxima entre clics de una sesión, en segundos")
+    parser.add_argument("--mezcla", type=interpretar_mezcla, default=MEZCLA,
+                        help="pesos por acción, ej: busqueda=3,detalle=3,individual=2,masiva=1,fraternidad=1")
+    parser.add_argument("--colegio", help="colegio_id de los profesores simulados (por defecto el que tiene más)")
+    parser.add_argument("--timeout", type=float, default=120, help="límite por re-ejecución del script")
+    parser.add_argument("--max-p95", type=float, help="falla si el p95 de alguna acción supera estos segundos")
+    parser.add_argument("--sembrar", action="store_true", help="aplica migraciones y siembra datos si está vacía")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--forzar", action="store_true", help="corre aunque las versiones no sean las probadas")
+    args = parser.parse_args()
+
+    distintas = versiones_distintas()
+    if distintas and not args.forzar:
+        print("❌ Versiones no probadas: " + ", ".join(distintas) +
+              ". Revisa streamlit_compartido o usa --forzar.")
+        return 1
+
+    from sqlalchemy import create_engine
+
+    secretos = leer_secretos(args.secrets)
+    admin = create_engine(url_de(secretos))
+    if args.sembrar:
+        import migrar
+        from verificar_planes import sembrar
+        migrar.aplicar(admin)
+        sembrar(admin, colegios=5, estudiantes=600, puntos=100_000)
+
+    emails = profesores_de_prueba(admin, args.colegio)
+    admin.dispose()
+    if not emails:
+        print("❌ No hay profesores en la base; usa --sembrar o --colegio.")
+        return 1
+
+    resultados = Resultados()
+    with supabase_falso(), streamlit_compartido(secretos), MedidorPool(capacidad_pool()) as medidor:
+        # Una corrida previa carga los módulos y deja listo el Runtime compartido.
+        calentamiento = Sesion(emails[0], Resultados(), args.timeout, args.semilla)
+        calentamiento.login()
+
+        sesiones = [Sesion(emails[i % len(emails)], resultados, args.timeout, args.semilla + i)
+                    for i in range(args.sesiones)]
+        print(f"👩‍🏫 {len(sesiones)} sesiones con {len(set(emails[:len(sesiones)]))} profesores distintos")
+
+        with ThreadPoolExecutor(max_workers=len(sesiones)) as pool:
+            list(pool.map(Sesion.login, sesiones))
+            inicio = time.monotonic()
+            hasta = inicio + args.duracion
+            list(pool.map(lambda s: s.recorrer(args.mezcla, hasta, args.pausa), sesiones))
+            total_s = time.monotonic() - inicio
+
+    fallas = []
+    hechas = sum(len(v) for a, v in resultados.latencias.items() if a != "login")
+    print(f"\n{'acción':<14}{'n':>7}{'p50 (s)':>10}{'p95 (s)':>10}{'p99 (s)':>10}{'errores':>9}{'omitidas':>10}")
+    for accion in ["login", *MEZCLA, "recarga"]:
+        lat = resultados.latencias.get(accion, [])
+        err = resultados.errores.get(accion, [])
+        omitidas = resultados.omitidas.get(accion, 0)
+        if not lat and not err and not omitidas:
+            continue
+        p95 = percentil(lat, 95)
+        print(f"{accion:<14}{len(lat):>7}{percentil(lat, 50):>10.3f}{p95:>10.3f}"
+              f"{percentil(lat, 99):>10.3f}{len(err):>9}{omitidas:>10}")
+        if args.max_p95 is not None and p95 > args.max_p95:
+            fallas.append(f"{accion}: p95 {p95:.3f}s > {args.max_p95:.3f}s")
+
+    retenidas, nuevas = medidor.retenidas, medidor.conexiones_nuevas
+    agotado = sum("QueuePool limit" in e for lista in resultados.errores.values() for e in lista)
+    print(f"\n⚡ Rendimiento: {hechas / total_s:.1f} acciones/s en {total_s:.0f}s")
+    print(f"🔌 Conexión retenida por uso: p50 {percentil(retenidas, 50) * 1000:.1f} ms · "
+          f"p95 {percentil(retenidas, 95) * 1000:.1f} ms · p99 {percentil(retenidas, 99) * 1000:.1f} ms · "
+          f"máx {max(retenidas, default=0):.3f} s ({len(retenidas)} usos)")
+    print(f"🔌 Conexiones nuevas: {len(nuevas)} · p95 {percentil(nuevas, 95) * 1000:.1f} ms")
+    print(f"🔌 Conexiones en uso a la vez: máx {medidor.max_en_uso} de {medidor.capacidad} · "
+          f"pool lleno {medidor.lleno} veces · agotado (timeout) {agotado} veces")
+
+    errores = defaultdict(int)
+    for lista in resultados.errores.values():
+        for e in lista:
+            errores[e.splitlines()[0][:120]] += 1
+    if errores:
+        print("\n❌ Errores:")
+        for e, n in sorted(errores.items(), key=lambda x: -x[1]):
+            print(f"  {n:>5} × {e}")
+        fallas.append(f"{sum(errores.values())} errores")
+
+    if fallas:
+        print("\n❌ " + "; ".join(fallas))
+        return 1
+    print("\n✅ Sin errores.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+import argparse
+import difflib
+import sys
+import time
+
+import pandas as pd
+
+# =========================
+# 🧮 Conciliación de listados CSV con la base
+# =========================
+# Compara un listado heredado (como Horbwartz.csv: ';', latin-1, una columna
+# por valor, Total y NombreCompleto) con el resumen actual del colegio y
+# devuelve una fila por hallazgo:
+#   nuevo         -> la fila no corresponde a ningún estudiante de la base
+#   cambiado      -> corresponde, pero nombre/apellidos/fraternidad/código difieren
+#   duplicado     -> código o nombre repetido en el CSV, o dos filas para el mismo estudiante
+#   puntos        -> puntos por valor distintos a la base, o Total ≠ suma de los valores
+#   inconsistente -> NombreCompleto no coincide con Nombre + Apellidos
+# Primero se cruza por código; las filas que quedan se emparejan por nombre
+# parecido, comparando solo contra estudiantes del mismo bloque (mismo inicio
+# de apellido, o mismo inicio de nombre e inicial del apellido) para no
+# comparar todos contra todos.
+#
+#   python conciliar.py Horbwartz.csv postgresql://... <colegio_id> --salida diferencias.csv
+
+TIPOS = ["nuevo", "cambiado", "duplicado", "puntos", "inconsistente"]
+COLUMNAS_FIJAS = {"Código": "codigo", "Nombre": "nombre", "Apellidos": "apellidos",
+                  "Fraternidad": "fraternidad", "Total": "total", "NombreCompleto": "nombre_completo"}
+UMBRAL = 0.88
+
+
+def normalizar(serie: pd.Series) -> pd.Series:
+    # Minúsculas, sin tildes ni signos y con un solo espacio entre palabras.
+    return (serie.fillna("").astype(str)
+            .str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii")
+            .str.lower().str.replace(r"[^a-z0-9]+", " ", regex=True).str.strip())
+
+
+def normalizar_codigo(serie: pd.Series) -> pd.Series:
+    codigo = serie.astype("string").str.strip().str.replace(r"\.0$", "", regex=True)
+    return codigo.mask(codigo == "")
+
+
+def leer_csv(ruta, sep: str = ";", encoding: str = "latin-1") -> tuple:
+    crudo = pd.read_csv(ruta, sep=sep, encoding=encoding, dtype=str, keep_default_na=False)
+    faltan = [c for c in ["Código", "Nombre", "Apellidos"] if c not in crudo.columns]
+    if faltan:
+        raise ValueError(f"Al CSV le faltan columnas: {', '.join(faltan)}")
+    valores = [c for c in crudo.columns if c not in COLUMNAS_FIJAS]
+
+    df = crudo.rename(columns=COLUMNAS_FIJAS)
+    for col in COLUMNAS_FIJAS.values():
+        if col not in df.columns:
+            df[col] = ""
+    df["fila"] = df.index + 2  # línea del archivo, contando el encabezado
+    df["codigo"] = normalizar_codigo(df["codigo"])
+    df["total"] = pd.to_numeric(df["total"], errors="coerce")
+    for v in valores:
+        df[v] = pd.to_numeric(df[v], errors="coerce").fillna(0).astype("int64")
+    return df, valores
+
+
+def leer_resumen_bd(engine, colegio_id) -> tuple:
+    from sqlalchemy import text
+
+    q = text("""
+        SELECT estudiante_id, codigo, nombre, apellidos, fraternidad, valor, puntos
+        FROM resumen_puntos_estudiantes WHERE colegio_id = :cid
+    """)
+    with engine.connect() as conn:
+        largo = pd.read_sql(q, conn, params={"cid": str(colegio_id)})
+    largo["estudiante_id"] = largo["estudiante_id"].astype(str)
+    largo["puntos"] = pd.to_numeric(largo["puntos"], errors="coerce").fillna(0).astype("int64")
+
+    perfil = (largo.drop_duplicates("estudiante_id")
+              [["estudiante_id", "codigo", "nombre", "apellidos", "fraternidad"]]
+              .set_index("estudiante_id"))
+    por_valor = largo.dropna(subset=["valor"]).pivot_table(
+        index="estudiante_id", columns="valor", values="puntos", aggfunc="sum", fill_value=0)
+    bd = perfil.join(por_valor).reset_index()
+    valores = list(por_valor.columns)
+    bd[valores] = bd[valores].fillna(0).astype("int64")
+    bd["codigo"] = normalizar_codigo(bd["codigo"])
+    return bd, valores
+
+
+def _claves(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df["_nombre"] = normalizar(df["nombre"])
+    df["_apellidos"] = normalizar(df["apellidos"])
+    df["_clave"] = (df["_nombre"] + " " + df["_apellidos"]).str.strip()
+    # Bloques: un error de digitación al inicio de un apellido o del nombre
+    # saca a la fila de un bloque, pero no de los dos.
+    # Se arman como texto explícito: con el frame vacío (colegio sin
+    # estudiantes) split con expand=True devuelve columnas float.
+    apellidos = df["_apellidos"].str.split(" ", n=1)
+    primero = apellidos.str[0].fillna("").astype(str)
+    segundo = apellidos.str[1].fillna("").astype(str)
+    df["_bloque_a"] = primero.str[:4] + "|" + df["_nombre"].str[:1]
+    df["_bloque_b"] = df["_nombre"].str[:3] + "|" + segundo.str[:2]
+    return df
+
+
+def _hallazgos(filas: pd.DataFrame, tipo: str, detalle) -> pd.DataFrame:
+    return pd.DataFrame({
+        "tipo": tipo,
+        "fila_csv": filas["fila"].to_numpy(),
+        "codigo": filas["codigo"].to_numpy(),
+        "nombre": filas["nombre"].to_numpy(),
+        "apellidos": filas["apellidos"].to_numpy(),
+        "estudiante_id": filas["estudiante_id"].to_numpy() if "estudiante_id" in filas else None,
+        "detalle": detalle.to_numpy() if isinstance(detalle, pd.Series) else detalle,
+    })
+
+
+def _unir_detalles(partes: list, indice) -> pd.Series:
+    # Une con "; " los textos no vacíos de cada parte, sin recorrer fila por fila.
+    detalle = pd.Series("", index=indice)
+    for parte in partes:
+        detalle = detalle.where(parte == "", detalle + "; " + parte)
+    return detalle.str.removeprefix("; ")
+
+
+def _filas_por(df: pd.DataFrame, columna: str) -> pd.Series:
+    # "3, 10, 25": todas las filas del CSV que comparten el valor de `columna`.
+    filas = df.groupby(columna)["fila"].agg(lambda f: ", ".join(map(str, f)))
+    return df[columna].map(filas).astype(str)
+
+
+def emparejar_por_nombre(csv: pd.DataFrame, bd: pd.DataFrame, umbral: float = UMBRAL) -> pd.DataFrame:
+    # Devuelve (fila, estudiante_id, similitud) con el mejor candidato de cada fila.
+    candidatos = pd.concat([
+        csv[["fila", "_clave", b]].merge(bd[["estudiante_id", "_clave", b]], on=b, suffixes=("", "_bd"))
+        for b in ["_bloque_a", "_bloque_b"]
+    ], ignore_index=True)[["fila", "_clave", "estudiante_id", "_clave_bd"]].drop_duplicates(["fila", "estudiante_id"])
+    if candidatos.empty:
+        return pd.DataFrame(columns=["fila", "estudiante_id", "similitud"])
+
+    # Descarta rápido los pares con largos muy distintos antes de compararlos.
+    largo, largo_bd = candidatos["_clave"].str.len(), candidatos["_clave_bd"].str.len()
+    cota = 2 * largo.where(largo < largo_bd, largo_bd) / (largo + largo_bd).clip(lower=1)
+    candidatos = candidatos[cota >= umbral]
+
+    unicos = candidatos[["_clave", "_clave_bd"]].drop_duplicates()
+    unicos["similitud"] = [difflib.SequenceMatcher(None, a, b).ratio()
+                           for a, b in zip(unicos["_clave"], unicos["_clave_bd"])]
+    candidatos = candidatos.merge(unicos, on=["_clave", "_clave_bd"])
+    return (candidatos[candidatos["similitud"] >= umbral]
+            .sort_values(["fila", "similitud"], ascending=[True, False])
+            .drop_duplicates("fila")[["fila", "estudiante_id", "similitud"]])
+
+
+def conciliar(csv: pd.DataFrame, valores_csv: list, bd: pd.DataFrame, valores_bd: list,
+              umbral: float = UMBRAL) -> pd.DataFrame:
+    csv, bd = _claves(csv), _claves(bd)
+    resultado = []
+
+    # ---- Inconsistencias dentro del propio CSV ----
+    suma = csv[valores_csv].sum(axis=1)
+    malos = csv[csv["total"].notna() & (csv["total"] != suma)]
+    resultado.append(_hallazgos(malos, "puntos",
+                                "Total del CSV " + malos["total"].astype("int64").astype(str)
+                                + " ≠ suma de valores " + suma[malos.index].astype(str)))
+
+    completo = normalizar(csv["nombre_completo"])
+    malos = csv[(completo != "") & (completo != csv["_clave"])]
+    resultado.append(_hallazgos(malos, "inconsistente",
+                                "NombreCompleto '" + malos["nombre_completo"] + "' ≠ Nombre + Apellidos"))
+
+    # ---- Duplicados dentro del CSV ----
+    malos = csv[csv["codigo"].notna() & csv.duplicated("codigo", keep=False)]
+    resultado.append(_hallazgos(malos, "duplicado",
+                                "Código repetido en las filas " + _filas_por(malos, "codigo")))
+
+    # Mismo nombre con códigos distintos o sin código (si todos traen el mismo
+    # código ya quedó reportado arriba).
+    con_nombre = csv[csv["_clave"] != ""].assign(_sin_codigo=lambda d: d["codigo"].isna())
+    grupos = con_nombre.groupby("_clave")
+    malos = con_nombre[(grupos["fila"].transform("size") > 1)
+                       & ((grupos["codigo"].transform("nunique") > 1) | grupos["_sin_codigo"].transform("any"))]
+    resultado.append(_hallazgos(malos, "duplicado",
+                                "Mismo nombre en las filas " + _filas_por(malos, "_clave")))
+
+    # ---- Emparejar con la base: primero por código, luego por nombre ----
+    por_codigo = (csv[["fila", "codigo"]].dropna()
+                  .merge(bd[["estudiante_id", "codigo"]].dropna(), on="codigo")
+                  .drop_duplicates("fila")[["fila", "estudiante_id"]])
+    por_codigo["metodo"] = "código"
+
+    # Nombre idéntico (normalizado) y sin homónimos en la base.
+    pendientes = csv[~csv["fila"].isin(por_codigo["fila"])]
+    libres = bd[~bd["estudiante_id"].isin(por_codigo["estudiante_id"])]
+    unicos = libres[~libres.duplicated("_clave", keep=False) & (libres["_clave"] != "")]
+    por_nombre = pendientes[["fila", "_clave"]].merge(unicos[["estudiante_id", "_clave"]], on="_clave")
+    por_nombre["metodo"] = "nombre"
+
+    # El resto, por nombre parecido dentro de cada bloque.
+    pendientes = pendientes[~pendientes["fila"].isin(por_nombre["fila"])]
+    libres = libres[~libres["estudiante_id"].isin(por_nombre["estudiante_id"])]
+    parecidos = emparejar_por_nombre(pendientes, libres, umbral)
+    parecidos["metodo"] = "nombre " + (parecidos["similitud"] * 100).round().astype(int).astype(str) + "%"
+
+    pares = pd.concat([por_codigo, por_nombre[["fila", "estudiante_id", "metodo"]],
+                       parecidos[["fila", "estudiante_id", "metodo"]]])
+
+    nuevos = csv[~csv["fila"].isin(pares["fila"])]
+    resultado.append(_hallazgos(nuevos, "nuevo", "Sin estudiante equivalente en la base"))
+
+    # Dos filas del CSV con distinto código que caen en el mismo estudiante
+    # de la base (las de código repetido ya se reportaron arriba).
+    malos = csv.merge(pares[pares.duplicated("estudiante_id", keep=False)], on="fila")
+    malos = malos[malos.assign(_codigo=malos["codigo"].fillna(""))
+                  .groupby("estudiante_id")["_codigo"].transform("nunique") > 1]
+    resultado.append(_hallazgos(malos, "duplicado",
+                                "Mismo estudiante de la base que las filas " + _filas_por(malos, "estudiante_id")))
+
+    # ---- Comparar cada pareja campo por campo ----
+    a = csv.merge(pares, on="fila").merge(bd, on="estudiante_id", suffixes=("", "_bd"))
+
+    # (campo, columna a comparar, columna a mostrar)
+    campos = [("nombre", "_nombre", "nombre"), ("apellidos", "_apellidos", "apellidos"),
+              ("fraternidad", "_fraternidad", "fraternidad"), ("código", "codigo", "codigo")]
+    a["_fraternidad"], a["_fraternidad_bd"] = normalizar(a["fraternidad"]), normalizar(a["fraternidad_bd"])
+    partes = []
+    for campo, comparar, mostrar in campos:
+        distinto = a[comparar].fillna("") != a[f"{comparar}_bd"].fillna("")
+        texto = (f"{campo}: base '" + a[f"{mostrar}_bd"].fillna("").astype(str)
+                 + "' · csv '" + a[mostrar].fillna("").astype(str) + "'")
+        partes.append(texto.where(distinto, ""))
+    detalle = _unir_detalles(partes, a.index)
+    cambiados = a[detalle != ""]
+    resultado.append(_hallazgos(cambiados, "cambiado",
+                                "(" + cambiados["metodo"] + ") " + detalle[cambiados.index]))
+
+    comunes = [v for v in valores_csv if v in valores_bd]
+    partes = [(f"{v}: base " + a[f"{v}_bd"].astype(str) + " · csv " + a[v].astype(str))
+              .where(a[v] != a[f"{v}_bd"], "") for v in comunes]
+    detalle = _unir_detalles(partes, a.index)
+    distintos = a[detalle != ""]
+    resultado.append(_hallazgos(distintos, "puntos", detalle[distintos.index]))
+
+    hallazgos = pd.concat(resultado, ignore_index=True)
+    hallazgos["tipo"] = pd.Categorical(hallazgos["tipo"], categories=TIPOS)
+    return hallazgos.sort_values(["tipo", "fila_csv"], kind="stable").reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concilia un listado CSV heredado con la base")
+    parser.add_argument("csv")
+    parser.add_argument("db_url")
+    parser.add_argument("colegio_id")
+    parser.add_argument("--sep", default=";")
+    parser.add_argument("--encoding", default="latin-1")
+    parser.add_argument("--umbral", type=float, default=UMBRAL, help="similitud mínima de nombres (0-1)")
+    parser.add_argument("--salida", default="diferencias.csv")
+    args = parser.parse_args()
+
+    from sqlalchemy import create_engine
+
+    t0 = time.perf_counter()
+    csv, valores_csv = leer_csv(args.csv, args.sep, args.encoding)
+    bd, valores_bd = leer_resumen_bd(create_engine(args.db_url), args.colegio_id)
+    t1 = time.perf_counter()
+    hallazgos = conciliar(csv, valores_csv, bd, valores_bd, args.umbral)
+    t2 = time.perf_counter()
+
+    faltan = [v for v in valores_csv if v not in valores_bd]
+    if faltan:
+        print(f"⚠️ Valores del CSV que no existen en el colegio: {', '.join(faltan)}", file=sys.stderr)
+    # Mismo formato que los listados heredados, para abrirlo en Excel.
+    hallazgos.to_csv(args.salida, sep=";", index=False, encoding="utf-8-sig")
+
+    conteo = hallazgos["tipo"].value_counts()
+    print(f"{len(csv)} filas del CSV · {len(bd)} estudiantes en la base "
+          f"(lectura {t1 - t0:.2f}s, conciliación {t2 - t1:.2f}s)")
+    for tipo in TIPOS:
+        print(f"  {tipo:<14}{conteo.get(tipo, 0):>7}")
+    print(f"✅ Diferencias en {args.salida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
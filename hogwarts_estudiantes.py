@@ -1,7 +1,5 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-from sqlalchemy import create_engine
 
 # =========================
 # ⚙️ Configuración general
@@ -11,51 +9,70 @@ st.set_page_config(page_title="🎓 Portal del Estudiante", page_icon="📘", la
 # =========================
 # 🔗 Conexión a Supabase Postgres
 # =========================
-DB_USER = st.secrets["DB_USER"]
-DB_PASS = st.secrets["DB_PASS"]
-DB_HOST = st.secrets["DB_HOST"]
-DB_PORT = st.secrets["DB_PORT"]
-DB_NAME = st.secrets["DB_NAME"]
+@st.cache_resource
+def get_engine():
+    from sqlalchemy import create_engine
+    return create_engine(
+        f"postgresql://{st.secrets['DB_USER']}:{st.secrets['DB_PASS']}@{st.secrets['DB_HOST']}:{st.secrets['DB_PORT']}/{st.secrets['DB_NAME']}",
+        pool_pre_ping=True
+    )
 
-engine = create_engine(
-    f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
-    pool_pre_ping=True
-)
+engine = get_engine()
 
 # =========================
-# 📂 Función para leer resumen
+# 📂 Funciones para leer datos
 # =========================
+# La lista solo necesita nombres y códigos; el resumen de puntos se lee para
+# el estudiante elegido, así el portal nunca recorre el libro de puntos completo.
 @st.cache_data(ttl=60)
-def leer_resumen() -> pd.DataFrame:
-    query = "SELECT * FROM resumen_puntos_estudiantes;"
-    return pd.read_sql(query, engine)
+def leer_estudiantes() -> pd.DataFrame:
+    from sqlalchemy import text
+    query = text("""
+        SELECT e.codigo, e.nombre, e.apellidos
+        FROM estudiantes e
+        JOIN colegios c ON c.id = e.colegio_id
+        JOIN fraternidades f ON f.id = e.fraternidad_id
+        WHERE e.codigo IS NOT NULL
+        ORDER BY e.codigo, e.nombre, e.apellidos
+    """)
+    with engine.connect() as conn:
+        return pd.read_sql(query, conn)
 
-df = leer_resumen()
+@st.cache_data(ttl=60)
+def leer_resumen(codigo: str) -> pd.DataFrame:
+    from sqlalchemy import text
+    query = text("SELECT * FROM resumen_puntos_estudiantes WHERE codigo = :codigo")
+    with engine.connect() as conn:
+        return pd.read_sql(query, conn, params={"codigo": codigo})
+
+estudiantes = leer_estudiantes()
 
 # =========================
 # 🎓 Portal del Estudiante
 # =========================
 st.title("🎓 Portal del Estudiante - Sistema Hogwarts")
 
-# Pivot para tener una fila por estudiante y columnas dinámicas por valores
-df_pivot = df.pivot_table(
-    index=["codigo", "nombre", "apellidos", "grado", "fraternidad", "colegio"],
-    columns="valor",
-    values="puntos",
-    aggfunc="sum",
-    fill_value=0
-).reset_index()
-
-df_pivot["Total"] = df_pivot.drop(
-    columns=["codigo", "nombre", "apellidos", "grado", "fraternidad", "colegio"]
-).sum(axis=1)
-
 # Lista de estudiantes disponibles
-opciones = df_pivot.apply(lambda r: f"{r['nombre']} {r['apellidos']} ({r['codigo']})", axis=1).tolist()
+opciones = estudiantes.apply(lambda r: f"{r['nombre']} {r['apellidos']} ({r['codigo']})", axis=1).tolist()
 seleccion = st.selectbox("Selecciona tu nombre o código:", [""] + opciones)
 
 if seleccion != "":
     codigo = seleccion.split("(")[-1].replace(")", "").strip()
+    df = leer_resumen(codigo)
+
+    # Pivot para tener una fila por estudiante y columnas dinámicas por valores
+    df_pivot = df.pivot_table(
+        index=["codigo", "nombre", "apellidos", "grado", "fraternidad", "colegio"],
+        columns="valor",
+        values="puntos",
+        aggfunc="sum",
+        fill_value=0
+    ).reset_index()
+
+    df_pivot["Total"] = df_pivot.drop(
+        columns=["codigo", "nombre", "apellidos", "grado", "fraternidad", "colegio"]
+    ).sum(axis=1)
+
     alumno = df_pivot[df_pivot["codigo"] == codigo]
 
     if alumno.empty:
@@ -91,6 +108,11 @@ if seleccion != "":
         # =========================
         # Gráfico de barras
         # =========================
+        # matplotlib solo se carga cuando hay un estudiante seleccionado
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+
         fig, ax = plt.subplots(figsize=(5, 3))
         puntos_df.set_index("Categoría")["Puntos"].plot(kind="bar", ax=ax, color="skyblue")
         ax.set_ylabel("Puntos")
@@ -0,0 +1,57 @@
+-- =========================
+-- 🏫 Esquema base
+-- =========================
+-- Las tablas que usan las apps. En producción ya existen (Supabase) y esto no
+-- hace nada; en una base local vacía deja el esquema listo para las demás
+-- migraciones y para verificar_planes.py.
+
+CREATE TABLE IF NOT EXISTS colegios (
+    id      uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    nombre  text NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS fraternidades (
+    id          uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    nombre      text NOT NULL,
+    colegio_id  uuid REFERENCES colegios (id)
+);
+
+CREATE TABLE IF NOT EXISTS valores (
+    id          uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    nombre      text NOT NULL,
+    colegio_id  uuid REFERENCES colegios (id)
+);
+
+CREATE TABLE IF NOT EXISTS estudiantes (
+    id              uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    codigo          text,
+    nombre          text,
+    apellidos       text,
+    grado           text,
+    fraternidad_id  uuid REFERENCES fraternidades (id),
+    colegio_id      uuid REFERENCES colegios (id)
+);
+
+CREATE TABLE IF NOT EXISTS profesores (
+    id              uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    email           text,
+    cedula          text,
+    auth_id         uuid,
+    nombres         text,
+    apellidos       text,
+    rol             text,
+    asignatura      text,
+    area            text,
+    grados          text,
+    fraternidad_id  uuid REFERENCES fraternidades (id),
+    colegio_id      uuid REFERENCES colegios (id)
+);
+
+CREATE TABLE IF NOT EXISTS puntos (
+    id             uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    estudiante_id  uuid REFERENCES estudiantes (id),
+    valor_id       uuid REFERENCES valores (id),
+    cantidad       integer NOT NULL,
+    profesor_id    uuid REFERENCES profesores (id),
+    created_at     timestamptz NOT NULL DEFAULT now()
+);
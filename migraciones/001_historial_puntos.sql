@@ -0,0 +1,14 @@
+-- =========================
+-- 🧾 Historial de puntos (paginación por cursor)
+-- =========================
+-- El historial se pagina por la llave (created_at, id) en orden descendente.
+-- Estos índices compuestos permiten que cada página sea un index scan acotado
+-- por LIMIT, sin importar qué tan atrás esté el cursor.
+
+ALTER TABLE puntos ADD COLUMN IF NOT EXISTS created_at timestamptz NOT NULL DEFAULT now();
+
+CREATE INDEX IF NOT EXISTS puntos_estudiante_historial_idx
+    ON puntos (estudiante_id, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS puntos_profesor_historial_idx
+    ON puntos (profesor_id, created_at DESC, id DESC);
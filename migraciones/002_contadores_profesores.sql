@@ -0,0 +1,82 @@
+-- =========================
+-- 👨‍🏫 Contadores de actividad por profesor
+-- =========================
+-- Un contador por profesor × fraternidad × valor × semana, mantenido por
+-- triggers de sentencia sobre puntos. La analítica de profesores lee solo
+-- de aquí y nunca recorre el libro de puntos completo.
+
+CREATE TABLE IF NOT EXISTS contadores_puntos_profesor (
+    colegio_id      uuid    NOT NULL,
+    profesor_id     uuid,
+    fraternidad_id  uuid,
+    valor_id        uuid    NOT NULL,
+    semana          date    NOT NULL,
+    asignaciones    integer NOT NULL DEFAULT 0,
+    total_puntos    bigint  NOT NULL DEFAULT 0,
+    UNIQUE NULLS NOT DISTINCT (profesor_id, fraternidad_id, valor_id, semana)
+);
+
+CREATE INDEX IF NOT EXISTS contadores_puntos_profesor_colegio_idx
+    ON contadores_puntos_profesor (colegio_id, semana);
+
+CREATE OR REPLACE FUNCTION sumar_contadores_puntos_profesor() RETURNS trigger AS $$
+BEGIN
+    -- Tablas de transición: una asignación masiva se agrega en un solo upsert.
+    INSERT INTO contadores_puntos_profesor AS c
+        (colegio_id, profesor_id, fraternidad_id, valor_id, semana, asignaciones, total_puntos)
+    SELECT e.colegio_id, n.profesor_id, e.fraternidad_id, n.valor_id,
+           date_trunc('week', n.created_at)::date,
+           count(*), sum(n.cantidad)
+    FROM nuevos n
+    JOIN estudiantes e ON e.id = n.estudiante_id
+    GROUP BY 1, 2, 3, 4, 5
+    ON CONFLICT (profesor_id, fraternidad_id, valor_id, semana) DO UPDATE
+    SET asignaciones = c.asignaciones + EXCLUDED.asignaciones,
+        total_puntos = c.total_puntos + EXCLUDED.total_puntos;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION restar_contadores_puntos_profesor() RETURNS trigger AS $$
+BEGIN
+    UPDATE contadores_puntos_profesor c
+    SET asignaciones = c.asignaciones - b.asignaciones,
+        total_puntos = c.total_puntos - b.total_puntos
+    FROM (
+        SELECT b.profesor_id, e.fraternidad_id, b.valor_id,
+               date_trunc('week', b.created_at)::date AS semana,
+               count(*) AS asignaciones, sum(b.cantidad) AS total_puntos
+        FROM borrados b
+        JOIN estudiantes e ON e.id = b.estudiante_id
+        GROUP BY 1, 2, 3, 4
+    ) b
+    WHERE c.profesor_id IS NOT DISTINCT FROM b.profesor_id
+      AND c.fraternidad_id IS NOT DISTINCT FROM b.fraternidad_id
+      AND c.valor_id = b.valor_id
+      AND c.semana = b.semana;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS puntos_contadores_insert ON puntos;
+CREATE TRIGGER puntos_contadores_insert
+    AFTER INSERT ON puntos
+    REFERENCING NEW TABLE AS nuevos
+    FOR EACH STATEMENT EXECUTE FUNCTION sumar_contadores_puntos_profesor();
+
+DROP TRIGGER IF EXISTS puntos_contadores_delete ON puntos;
+CREATE TRIGGER puntos_contadores_delete
+    AFTER DELETE ON puntos
+    REFERENCING OLD TABLE AS borrados
+    FOR EACH STATEMENT EXECUTE FUNCTION restar_contadores_puntos_profesor();
+
+-- Carga inicial desde el histórico (solo si la tabla está vacía).
+INSERT INTO contadores_puntos_profesor
+    (colegio_id, profesor_id, fraternidad_id, valor_id, semana, asignaciones, total_puntos)
+SELECT e.colegio_id, p.profesor_id, e.fraternidad_id, p.valor_id,
+       date_trunc('week', p.created_at)::date,
+       count(*), sum(p.cantidad)
+FROM puntos p
+JOIN estudiantes e ON e.id = p.estudiante_id
+WHERE NOT EXISTS (SELECT 1 FROM contadores_puntos_profesor)
+GROUP BY 1, 2, 3, 4, 5;
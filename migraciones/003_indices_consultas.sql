@@ -0,0 +1,31 @@
+-- =========================
+-- ⚡ Índices de las consultas frecuentes
+-- =========================
+-- puntos.estudiante_id ya está cubierto por puntos_estudiante_historial_idx (001).
+
+-- Suma por estudiante × valor (vista resumen, leaderboards) sin tocar la tabla.
+CREATE INDEX IF NOT EXISTS puntos_estudiante_valor_idx
+    ON puntos (estudiante_id, valor_id) INCLUDE (cantidad);
+
+-- Estadísticas por fraternidad y valor.
+CREATE INDEX IF NOT EXISTS puntos_valor_idx
+    ON puntos (valor_id);
+
+CREATE INDEX IF NOT EXISTS estudiantes_colegio_fraternidad_idx
+    ON estudiantes (colegio_id, fraternidad_id);
+
+-- Portal del estudiante: resumen de un solo estudiante por código.
+CREATE INDEX IF NOT EXISTS estudiantes_codigo_idx
+    ON estudiantes (codigo);
+
+CREATE INDEX IF NOT EXISTS valores_colegio_nombre_idx
+    ON valores (colegio_id, nombre);
+
+CREATE INDEX IF NOT EXISTS fraternidades_colegio_idx
+    ON fraternidades (colegio_id);
+
+CREATE INDEX IF NOT EXISTS profesores_email_idx
+    ON profesores (email);
+
+CREATE INDEX IF NOT EXISTS profesores_cedula_colegio_idx
+    ON profesores (cedula, colegio_id);
@@ -0,0 +1,30 @@
+-- =========================
+-- 📋 Vista resumen_puntos_estudiantes
+-- =========================
+-- Una fila por estudiante × valor del colegio. La suma se hace con un
+-- LATERAL por (estudiante, valor), que se resuelve con un index-only scan
+-- sobre puntos_estudiante_valor_idx: filtrar por colegio o estudiante nunca
+-- recorre el libro completo.
+
+DROP VIEW IF EXISTS resumen_puntos_estudiantes;
+
+CREATE VIEW resumen_puntos_estudiantes AS
+SELECT e.id          AS estudiante_id,
+       e.codigo,
+       e.nombre,
+       e.apellidos,
+       e.grado,
+       f.nombre      AS fraternidad,
+       c.nombre      AS colegio,
+       e.colegio_id,
+       v.nombre      AS valor,
+       COALESCE(t.puntos, 0) AS puntos
+FROM estudiantes e
+JOIN colegios c ON c.id = e.colegio_id
+LEFT JOIN fraternidades f ON f.id = e.fraternidad_id
+JOIN valores v ON v.colegio_id = e.colegio_id
+LEFT JOIN LATERAL (
+    SELECT SUM(p.cantidad) AS puntos
+    FROM puntos p
+    WHERE p.estudiante_id = e.id AND p.valor_id = v.id
+) t ON true;
@@ -0,0 +1,14 @@
+-- =========================
+-- 🏷️ Versión de datos por colegio
+-- =========================
+-- Cada escritura de la app sube la versión de su colegio dentro de la misma
+-- transacción (ver notificaciones.notificar_puntos). El UPDATE toma el
+-- candado de la fila, así que el orden de las versiones es el orden en que
+-- confirman las transacciones de ese colegio. Las réplicas usan la versión
+-- como sello del cache compartido en disco.
+
+CREATE TABLE IF NOT EXISTS versiones_colegio (
+    colegio_id    uuid PRIMARY KEY REFERENCES colegios(id) ON DELETE CASCADE,
+    version       bigint NOT NULL DEFAULT 0,
+    actualizada_en timestamptz NOT NULL DEFAULT now()
+);
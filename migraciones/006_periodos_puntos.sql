@@ -0,0 +1,126 @@
+-- =========================
+-- 🗓️ Libro de puntos por periodos + saldos compactados
+-- =========================
+-- puntos pasa a ser una tabla particionada por rango de created_at, una
+-- partición por periodo académico (ver periodos.py). Los periodos cerrados
+-- se compactan: sus filas se suman en puntos_acumulados (una fila por
+-- estudiante × valor) y la partición se desprende y se mueve al esquema
+-- archivo. Así las vistas y leaderboards leen solo el periodo en curso más
+-- los saldos compactados (vista saldo_puntos).
+--
+-- La tabla existente se conserva tal cual como la partición
+-- puntos_anteriores (todo lo registrado hasta el día de la migración) y las
+-- fechas sin periodo caen en puntos_sin_periodo.
+
+CREATE SCHEMA IF NOT EXISTS archivo;
+
+CREATE TABLE IF NOT EXISTS periodos_puntos (
+    nombre         text PRIMARY KEY,
+    desde          timestamptz NOT NULL,
+    hasta          timestamptz NOT NULL,
+    particion      text NOT NULL UNIQUE,
+    compactado_en  timestamptz,
+    CHECK (desde < hasta)
+);
+
+CREATE TABLE IF NOT EXISTS puntos_acumulados (
+    estudiante_id   uuid NOT NULL REFERENCES estudiantes (id),
+    valor_id        uuid NOT NULL REFERENCES valores (id),
+    cantidad        integer NOT NULL DEFAULT 0,
+    actualizado_en  timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (estudiante_id, valor_id)
+);
+
+-- Las vistas se recrean abajo contra la tabla particionada.
+DROP VIEW IF EXISTS resumen_puntos_estudiantes;
+
+DO $$
+DECLARE
+    corte timestamptz := date_trunc('day', now()) + interval '1 day';
+    idx record;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'puntos'::regclass) THEN
+        RETURN;
+    END IF;
+
+    ALTER TABLE puntos RENAME TO puntos_anteriores;
+    -- Los índices existentes pasan a ser los de la partición; la tabla madre
+    -- usa los nombres de siempre y, al adjuntar, reutiliza los equivalentes.
+    FOR idx IN
+        SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = 'puntos_anteriores'::regclass
+    LOOP
+        EXECUTE format('ALTER INDEX %I RENAME TO %I', idx.relname, left('anteriores_' || idx.relname, 63));
+    END LOOP;
+
+    -- Su llave primaria (id) se reemplaza por la de la tabla madre (id, created_at).
+    FOR idx IN
+        SELECT conname AS relname FROM pg_constraint
+        WHERE conrelid = 'puntos_anteriores'::regclass AND contype = 'p'
+    LOOP
+        EXECUTE format('ALTER TABLE puntos_anteriores DROP CONSTRAINT %I', idx.relname);
+    END LOOP;
+
+    DROP TRIGGER IF EXISTS puntos_contadores_insert ON puntos_anteriores;
+    DROP TRIGGER IF EXISTS puntos_contadores_delete ON puntos_anteriores;
+
+    CREATE TABLE puntos (LIKE puntos_anteriores INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+        PARTITION BY RANGE (created_at);
+    -- La llave de partición tiene que ser parte de la llave primaria.
+    ALTER TABLE puntos ADD PRIMARY KEY (id, created_at);
+    ALTER TABLE puntos ADD FOREIGN KEY (estudiante_id) REFERENCES estudiantes (id);
+    ALTER TABLE puntos ADD FOREIGN KEY (valor_id) REFERENCES valores (id);
+    ALTER TABLE puntos ADD FOREIGN KEY (profesor_id) REFERENCES profesores (id);
+
+    CREATE INDEX puntos_estudiante_historial_idx ON puntos (estudiante_id, created_at DESC, id DESC);
+    CREATE INDEX puntos_profesor_historial_idx ON puntos (profesor_id, created_at DESC, id DESC);
+    CREATE INDEX puntos_estudiante_valor_idx ON puntos (estudiante_id, valor_id) INCLUDE (cantidad);
+    CREATE INDEX puntos_valor_idx ON puntos (valor_id);
+
+    EXECUTE format('ALTER TABLE puntos ATTACH PARTITION puntos_anteriores FOR VALUES FROM (MINVALUE) TO (%L)', corte);
+    CREATE TABLE puntos_sin_periodo PARTITION OF puntos DEFAULT;
+
+    INSERT INTO periodos_puntos (nombre, desde, hasta, particion)
+    VALUES ('anteriores', '-infinity', corte, 'puntos_anteriores');
+END $$;
+
+-- Los contadores semanales siguen igual, ahora sobre la tabla madre.
+DROP TRIGGER IF EXISTS puntos_contadores_insert ON puntos;
+CREATE TRIGGER puntos_contadores_insert
+    AFTER INSERT ON puntos
+    REFERENCING NEW TABLE AS nuevos
+    FOR EACH STATEMENT EXECUTE FUNCTION sumar_contadores_puntos_profesor();
+
+DROP TRIGGER IF EXISTS puntos_contadores_delete ON puntos;
+CREATE TRIGGER puntos_contadores_delete
+    AFTER DELETE ON puntos
+    REFERENCING OLD TABLE AS borrados
+    FOR EACH STATEMENT EXECUTE FUNCTION restar_contadores_puntos_profesor();
+
+-- Saldo vivo: movimientos de los periodos sin compactar + saldos compactados.
+-- Filtrar por estudiante_id baja a los índices de las dos ramas.
+CREATE OR REPLACE VIEW saldo_puntos AS
+SELECT estudiante_id, valor_id, cantidad FROM puntos
+UNION ALL
+SELECT estudiante_id, valor_id, cantidad FROM puntos_acumulados;
+
+CREATE VIEW resumen_puntos_estudiantes AS
+SELECT e.id          AS estudiante_id,
+       e.codigo,
+       e.nombre,
+       e.apellidos,
+       e.grado,
+       f.nombre      AS fraternidad,
+       c.nombre      AS colegio,
+       e.colegio_id,
+       v.nombre      AS valor,
+       COALESCE(t.puntos, 0) AS puntos
+FROM estudiantes e
+JOIN colegios c ON c.id = e.colegio_id
+LEFT JOIN fraternidades f ON f.id = e.fraternidad_id
+JOIN valores v ON v.colegio_id = e.colegio_id
+LEFT JOIN LATERAL (
+    SELECT SUM(p.cantidad) AS puntos
+    FROM saldo_puntos p
+    WHERE p.estudiante_id = e.id AND p.valor_id = v.id
+) t ON true;
@@ -0,0 +1,11 @@
+-- =========================
+-- 🎓 Tabla por grado y sección
+-- =========================
+-- La tabla paginada de app.py (leer_pagina_seccion) filtra por colegio y
+-- grado y avanza con keyset sobre (apellidos, nombre, id) vacíos como ''. Con
+-- este índice, una sección se lee en orden y la página termina en LIMIT sin
+-- ordenar a todo el grado. Las expresiones deben coincidir con las de la
+-- consulta para que el planificador lo use.
+
+CREATE INDEX IF NOT EXISTS estudiantes_seccion_orden_idx
+    ON estudiantes (colegio_id, grado, (COALESCE(apellidos, '')), (COALESCE(nombre, '')), id);
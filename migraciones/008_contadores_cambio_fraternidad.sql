@@ -0,0 +1,66 @@
+-- =========================
+-- 👨‍🏫 Contadores al cambiar de fraternidad
+-- =========================
+-- Los contadores de la migración 002 guardan la fraternidad que tenía el
+-- estudiante al insertar el punto, pero el trigger de borrado la vuelve a
+-- leer de estudiantes. Si el estudiante cambió de fraternidad en medio, el
+-- borrado restaba de la fila equivocada (o de ninguna) y los contadores se
+-- desviaban para siempre. Este trigger mueve los movimientos vivos del
+-- estudiante a su fraternidad nueva en el mismo UPDATE: así insertar, borrar
+-- y el leaderboard del resto de la app usan la misma fraternidad (la actual).
+-- Los periodos ya compactados (periodos.py) no tienen filas en puntos y se
+-- quedan contados en la fraternidad anterior.
+--
+-- Requiere Postgres 15 o más: la llave única de 002 usa UNIQUE NULLS NOT
+-- DISTINCT (profesor y fraternidad pueden ser NULL).
+--
+-- Los triggers de sentencia con tablas de transición no admiten lista de
+-- columnas (UPDATE OF), así que se filtra por fraternidad dentro de la función.
+
+CREATE OR REPLACE FUNCTION mover_contadores_fraternidad() RETURNS trigger AS $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM antes a JOIN despues d ON d.id = a.id
+        WHERE a.fraternidad_id IS DISTINCT FROM d.fraternidad_id
+    ) THEN
+        RETURN NULL;
+    END IF;
+
+    UPDATE contadores_puntos_profesor c
+    SET asignaciones = c.asignaciones - m.asignaciones,
+        total_puntos = c.total_puntos - m.total_puntos
+    FROM (
+        SELECT p.profesor_id, a.fraternidad_id, p.valor_id,
+               date_trunc('week', p.created_at)::date AS semana,
+               count(*) AS asignaciones, sum(p.cantidad) AS total_puntos
+        FROM antes a
+        JOIN despues d ON d.id = a.id AND d.fraternidad_id IS DISTINCT FROM a.fraternidad_id
+        JOIN puntos p ON p.estudiante_id = a.id
+        GROUP BY 1, 2, 3, 4
+    ) m
+    WHERE c.profesor_id IS NOT DISTINCT FROM m.profesor_id
+      AND c.fraternidad_id IS NOT DISTINCT FROM m.fraternidad_id
+      AND c.valor_id = m.valor_id
+      AND c.semana = m.semana;
+
+    INSERT INTO contadores_puntos_profesor AS c
+        (colegio_id, profesor_id, fraternidad_id, valor_id, semana, asignaciones, total_puntos)
+    SELECT d.colegio_id, p.profesor_id, d.fraternidad_id, p.valor_id,
+           date_trunc('week', p.created_at)::date,
+           count(*), sum(p.cantidad)
+    FROM antes a
+    JOIN despues d ON d.id = a.id AND d.fraternidad_id IS DISTINCT FROM a.fraternidad_id
+    JOIN puntos p ON p.estudiante_id = d.id
+    GROUP BY 1, 2, 3, 4, 5
+    ON CONFLICT (profesor_id, fraternidad_id, valor_id, semana) DO UPDATE
+    SET asignaciones = c.asignaciones + EXCLUDED.asignaciones,
+        total_puntos = c.total_puntos + EXCLUDED.total_puntos;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS estudiantes_contadores_fraternidad ON estudiantes;
+CREATE TRIGGER estudiantes_contadores_fraternidad
+    AFTER UPDATE ON estudiantes
+    REFERENCING OLD TABLE AS antes NEW TABLE AS despues
+    FOR EACH STATEMENT EXECUTE FUNCTION mover_contadores_fraternidad();
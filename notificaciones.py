@@ -0,0 +1,208 @@
+import logging
+import select
+import sys
+import threading
+import uuid
+from collections import defaultdict
+
+from sqlalchemy import text
+
+# =========================
+# 📣 Avisos de cambios de puntos (LISTEN/NOTIFY)
+# =========================
+# Las rutas de escritura emiten pg_notify(CANAL, "<colegio_id>:<origen>") dentro
+# de su transacción; Postgres lo entrega solo si la transacción confirma.
+# Cada proceso de la app mantiene una EscuchaPuntos que lleva un número de
+# versión por colegio. Las funciones cacheadas reciben esa versión como
+# argumento, así que un aviso invalida solo los agregados de ese colegio.
+#
+# Además, con el cache en disco activo, notificar_puntos sube
+# versiones_colegio en la misma transacción: esa versión sí es común a todas
+# las réplicas y sirve de sello para el cache compartido (cache_disco.py).
+#
+# Nota: LISTEN necesita una conexión de sesión (conexión directa o pooler en
+# modo sesión); con el pooler en modo transacción los avisos no llegan y la
+# app sigue funcionando con el TTL de st.cache_data.
+
+log = logging.getLogger(__name__)
+
+CANAL = "puntos_colegio"
+
+# Identifica a este proceso: sus propios avisos ya se aplicaron localmente.
+ORIGEN = uuid.uuid4().hex
+
+
+def notificar_puntos(conn, colegio_id, con_version: bool = False) -> None:
+    # La versión en la base es la que comparten las réplicas (cache en disco);
+    # el aviso solo acelera que cada proceso se entere. con_version requiere
+    # la migración 005 (versiones_colegio); sin cache en disco no hace falta.
+    if con_version:
+        conn.execute(text("""
+            INSERT INTO versiones_colegio (colegio_id, version) VALUES (:cid, 1)
+            ON CONFLICT (colegio_id) DO UPDATE
+            SET version = versiones_colegio.version + 1, actualizada_en = now()
+        """), {"cid": str(colegio_id)})
+    conn.execute(text("SELECT pg_notify(:canal, :payload)"),
+                 {"canal": CANAL, "payload": f"{colegio_id}:{ORIGEN}"})
+
+
+def version_en_base(conn, colegio_id) -> int:
+    fila = conn.execute(text("SELECT version FROM versiones_colegio WHERE colegio_id = :cid"),
+                        {"cid": str(colegio_id)}).first()
+    return fila[0] if fila else 0
+
+
+class EscuchaPuntos:
+    def __init__(self, engine, canal: str = CANAL, espera_s: float = 5.0, reintento_s: float = 5.0):
+        self.engine = engine
+        self.canal = canal
+        self.espera_s = espera_s
+        self.reintento_s = reintento_s
+        self.conectada = threading.Event()
+
+        self._versiones = defaultdict(int)
+        # Sube en cada reconexión: mientras estuvimos caídos pudimos perder
+        # avisos, así que todas las versiones anteriores dejan de valer.
+        self._epoca = 0
+        self._suscriptores = []
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._escuchar, name="escucha-puntos", daemon=True)
+        self._hilo.start()
+
+    def version(self, colegio_id) -> tuple:
+        with self._lock:
+            return self._epoca, self._versiones[str(colegio_id)]
+
+    def marcar(self, colegio_id) -> None:
+        colegio_id = str(colegio_id)
+        with self._lock:
+            self._versiones[colegio_id] += 1
+            suscriptores = list(self._suscriptores)
+        for fn in suscriptores:
+            try:
+                fn(colegio_id)
+            except Exception:
+                log.exception("Error en suscriptor de avisos de puntos")
+
+    def suscribir(self, fn) -> None:
+        with self._lock:
+            self._suscriptores.append(fn)
+
+    def detener(self, timeout: float = None) -> None:
+        self._detener.set()
+        self._hilo.join(timeout)
+
+    def _procesar(self, payload: str) -> None:
+        colegio_id, _, origen = payload.partition(":")
+        if colegio_id and origen != ORIGEN:
+            self.marcar(colegio_id)
+
+    def _escuchar(self) -> None:
+        while not self._detener.is_set():
+            dbapi = None
+            try:
+                # Conexión propia fuera del pool: queda escuchando todo el tiempo.
+                raw = self.engine.raw_connection()
+                dbapi = raw.driver_connection
+                raw.detach()
+                dbapi.autocommit = True
+                dbapi.cursor().execute(f"LISTEN {self.canal}")
+                with self._lock:
+                    self._epoca += 1
+                self.conectada.set()
+                self._recibir(dbapi)
+            except Exception:
+                log.exception("Escucha de puntos desconectada; reintentando")
+            finally:
+                self.conectada.clear()
+                if dbapi is not None:
+                    try:
+                        dbapi.close()
+                    except Exception:
+                        pass
+            self._detener.wait(self.reintento_s)
+
+    def _recibir(self, dbapi) -> None:
+        while not self._detener.is_set():
+            if hasattr(dbapi, "poll"):
+                # psycopg2
+                if select.select([dbapi], [], [], self.espera_s)[0]:
+                    dbapi.poll()
+                    while dbapi.notifies:
+                        self._procesar(dbapi.notifies.pop(0).payload)
+            else:
+                # psycopg 3
+                for aviso in dbapi.notifies(timeout=self.espera_s):
+                    self._procesar(aviso.payload)
+
+
+def verificar(engine, espera_s: float = 5.0) -> list:
+    # Prueba autocontenida contra un Postgres local: devuelve las fallas.
+    fallas = []
+    escucha = EscuchaPuntos(engine, espera_s=0.2, reintento_s=0.5)
+    try:
+        if not escucha.conectada.wait(espera_s):
+            return ["la escucha no se conectó"]
+        avisado, otro = str(uuid.uuid4()), str(uuid.uuid4())
+        llegaron = threading.Event()
+        escucha.suscribir(lambda cid: cid == avisado and llegaron.set())
+        antes_avisado, antes_otro = escucha.version(avisado), escucha.version(otro)
+
+        # Un aviso dentro de una transacción que se revierte nunca llega.
+        with engine.connect() as conn:
+            notificar_puntos(conn, avisado)
+            conn.rollback()
+        # Uno de este mismo proceso se ignora (ya se aplicó con marcar).
+        with engine.begin() as conn:
+            notificar_puntos(conn, otro)
+        # Uno de otro proceso sube solo la versión de su colegio.
+        with engine.begin() as conn:
+            conn.execute(text("SELECT pg_notify(:canal, :payload)"),
+                         {"canal": escucha.canal, "payload": f"{avisado}:otro-proceso"})
+
+        if not llegaron.wait(espera_s):
+            fallas.append("el aviso de otro proceso no llegó")
+        # Los avisos se entregan en orden de commit: si llegó el último, los
+        # anteriores ya se procesaron (o no se enviaron).
+        epoca, version = escucha.version(avisado)
+        if (epoca, version) != (antes_avisado[0], antes_avisado[1] + 1):
+            fallas.append(f"versión del colegio avisado {antes_avisado} -> {(epoca, version)}, se esperaba +1")
+        if escucha.version(otro) != antes_otro:
+            fallas.append(f"cambió la versión de otro colegio: {antes_otro} -> {escucha.version(otro)}")
+    finally:
+        escucha.detener(2)
+    return fallas
+
+
+if __name__ == "__main__":
+    #   python notificaciones.py postgresql://postgres@localhost:5432/postgres --verificar
+    # Sin --verificar queda escuchando y muestra cada aviso (prueba manual con
+    #   psql -c "SELECT pg_notify('puntos_colegio', '<colegio_id>:otro')").
+    import argparse
+
+    from sqlalchemy import create_engine
+
+    parser = argparse.ArgumentParser(description="Escucha de avisos de puntos (LISTEN/NOTIFY)")
+    parser.add_argument("db_url", help="base Postgres local")
+    parser.add_argument("--verificar", action="store_true", help="prueba automática y sale")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    engine = create_engine(args.db_url)
+    if args.verificar:
+        fallas = verificar(engine)
+        for falla in fallas:
+            print(f"❌ {falla}")
+        if not fallas:
+            print("✅ Los avisos llegan, solo suben la versión de su colegio y respetan el commit.")
+        sys.exit(1 if fallas else 0)
+
+    escucha = EscuchaPuntos(engine)
+    escucha.suscribir(lambda cid: print(f"📣 colegio {cid} -> versión {escucha.version(cid)}"))
+    escucha.conectada.wait(10)
+    print(f"Escuchando '{CANAL}'... (Ctrl+C para salir)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        escucha.detener(1)
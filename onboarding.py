@@ -1,26 +1,21 @@
 import streamlit as st
-from sqlalchemy import create_engine, text
-from supabase import create_client, Client
 
 st.set_page_config(page_title="Resetear acceso", page_icon="🔑")
 
 # =========================
 # 🔗 Conexión DB
 # =========================
-DB_USER = st.secrets["DB_USER"]
-DB_PASS = st.secrets["DB_PASS"]
-DB_HOST = st.secrets["DB_HOST"]
-DB_PORT = st.secrets["DB_PORT"]
-DB_NAME = st.secrets["DB_NAME"]
-
-engine = create_engine(
-    f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}", pool_pre_ping=True
-)
-
-# 🔑 Supabase
-url: str = st.secrets["SUPABASE_URL"]
-key: str = st.secrets["SUPABASE_KEY"]
-supabase: Client = create_client(url, key)
+@st.cache_resource
+def get_engine():
+    from sqlalchemy import create_engine
+    return create_engine(
+        f"postgresql://{st.secrets['DB_USER']}:{st.secrets['DB_PASS']}@{st.secrets['DB_HOST']}:{st.secrets['DB_PORT']}/{st.secrets['DB_NAME']}", pool_pre_ping=True
+    )
+
+# 🔑 Supabase (solo se crea al enviar el formulario)
+def get_supabase():
+    from supabase import create_client
+    return create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"])
 
 st.title("🔑 Resetear acceso del profesor")
 
@@ -33,8 +28,10 @@ with st.form("reset_form"):
             st.error("⚠️ Debes ingresar la cédula.")
         else:
             try:
+                from sqlalchemy import text
+
                 # Buscar profesor en DB
-                with engine.begin() as conn:
+                with get_engine().begin() as conn:
                     prof = conn.execute(
                         text("SELECT id, email, auth_id FROM profesores WHERE cedula = :ced"),
                         {"ced": cedula}
@@ -49,7 +46,7 @@ with st.form("reset_form"):
                     auth_id = str(prof.auth_id)
 
                     # 🔑 Actualizar solo contraseña en Supabase Auth
-                    supabase.auth.admin.update_user_by_id(
+                    get_supabase().auth.admin.update_user_by_id(
                         auth_id,
                         {"password": nueva_pass}
                     )
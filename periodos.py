@@ -0,0 +1,243 @@
+import argparse
+import re
+import sys
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, text
+
+# =========================
+# 🗓️ Periodos del libro de puntos
+# =========================
+# Cada periodo académico es una partición de puntos (migración 006).
+#   crear     -> crea la partición del periodo. Si ya hay puntos de esas fechas
+#                en puntos_sin_periodo, los mueve a la partición nueva.
+#   compactar -> para periodos ya cerrados: suma sus filas en puntos_acumulados
+#                (estudiante × valor), desprende la partición y la mueve al
+#                esquema archivo. Los totales no cambian, así que los caches
+#                siguen siendo válidos.
+#   asegurar  -> crea semestres (AAAA-1: enero-junio, AAAA-2: julio-diciembre)
+#                en los huecos entre periodos y hasta cubrir los próximos
+#                ANTICIPACION_DIAS. migrar.py lo corre en cada despliegue.
+#   estado    -> lista los periodos y cuántas filas vivas tiene cada uno.
+#
+#   python periodos.py postgresql://... crear 2027-1 2027-01-18 2027-06-19
+#   python periodos.py postgresql://... asegurar
+#   python periodos.py postgresql://... compactar --cerrados
+#
+# Lo ideal es crear cada periodo antes de que empiece (crearlo es instantáneo
+# y no mueve filas) y compactar de noche, fuera del horario de clases. Un
+# colegio con otro calendario crea sus periodos con crear antes de que
+# asegurar llegue a esas fechas; asegurar nunca pisa un periodo existente.
+# Para no depender de los despliegues, asegurar puede correr también a diario
+# (cron o un job programado).
+
+PARTICION_DEFECTO = "puntos_sin_periodo"
+ESQUEMA_ARCHIVO = "archivo"
+ANTICIPACION_DIAS = 31
+
+
+def nombre_particion(periodo: str) -> str:
+    limpio = re.sub(r"[^a-z0-9]+", "_", periodo.lower()).strip("_")
+    if not limpio:
+        raise ValueError(f"Nombre de periodo inválido: {periodo!r}")
+    return f"puntos_{limpio}"[:63]
+
+
+def crear(engine, periodo: str, desde: datetime, hasta: datetime, log=print) -> str:
+    particion = nombre_particion(periodo)
+    if desde >= hasta:
+        raise ValueError("La fecha de inicio debe ser anterior a la de fin")
+    with engine.begin() as conn:
+        conn.execute(text("LOCK TABLE periodos_puntos IN EXCLUSIVE MODE"))
+        choque = conn.execute(text("""
+            SELECT nombre FROM periodos_puntos
+            WHERE tstzrange(desde, hasta) && tstzrange(:desde, :hasta)
+        """), {"desde": desde, "hasta": hasta}).scalar()
+        if choque:
+            raise ValueError(f"Se cruza con el periodo {choque}")
+
+        rango = {"desde": desde, "hasta": hasta}
+        pendientes = conn.execute(text(f"""
+            SELECT count(*) FROM {PARTICION_DEFECTO}
+            WHERE created_at >= :desde AND created_at < :hasta
+        """), rango).scalar()
+
+        if pendientes:
+            # Con filas en la partición por defecto Postgres no deja crear la
+            # nueva: se desprende, se mueven las filas y se vuelve a adjuntar.
+            # Se escribe directo en las particiones para no disparar los
+            # triggers de contadores (las filas ya estaban contadas).
+            conn.execute(text(f"ALTER TABLE puntos DETACH PARTITION {PARTICION_DEFECTO}"))
+            conn.execute(text(f"CREATE TABLE {particion} (LIKE puntos INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+            conn.execute(text(f"""
+                INSERT INTO {particion}
+                SELECT * FROM {PARTICION_DEFECTO} WHERE created_at >= :desde AND created_at < :hasta
+            """), rango)
+            conn.execute(text(f"""
+                DELETE FROM {PARTICION_DEFECTO} WHERE created_at >= :desde AND created_at < :hasta
+            """), rango)
+            conn.execute(text(f"ALTER TABLE puntos ATTACH PARTITION {particion} "
+                              f"FOR VALUES FROM ('{desde.isoformat()}') TO ('{hasta.isoformat()}')"))
+            conn.execute(text(f"ALTER TABLE puntos ATTACH PARTITION {PARTICION_DEFECTO} DEFAULT"))
+        else:
+            conn.execute(text(f"CREATE TABLE {particion} PARTITION OF puntos "
+                              f"FOR VALUES FROM ('{desde.isoformat()}') TO ('{hasta.isoformat()}')"))
+
+        conn.execute(text("""
+            INSERT INTO periodos_puntos (nombre, desde, hasta, particion)
+            VALUES (:nombre, :desde, :hasta, :particion)
+        """), {"nombre": periodo, "particion": particion, **rango})
+    log(f"✅ Periodo {periodo} → {particion}" + (f" ({pendientes} puntos movidos)" if pendientes else ""))
+    return particion
+
+
+def compactar(engine, periodo: str, log=print) -> int:
+    with engine.begin() as conn:
+        fila = conn.execute(text("""
+            SELECT particion, hasta, compactado_en FROM periodos_puntos
+            WHERE nombre = :nombre FOR UPDATE
+        """), {"nombre": periodo}).first()
+        if fila is None:
+            raise ValueError(f"No existe el periodo {periodo}")
+        particion, hasta, compactado_en = fila
+        if compactado_en is not None:
+            log(f"ℹ️ {periodo} ya estaba compactado ({compactado_en:%Y-%m-%d}).")
+            return 0
+        if hasta > datetime.now(timezone.utc):
+            raise ValueError(f"El periodo {periodo} sigue abierto hasta {hasta:%Y-%m-%d}")
+
+        # DETACH toma un candado exclusivo sobre puntos hasta el COMMIT: los
+        # lectores esperan unos instantes y nunca ven el periodo contado dos
+        # veces ni perdido.
+        conn.execute(text("LOCK TABLE puntos IN ACCESS EXCLUSIVE MODE"))
+        saldos = conn.execute(text(f"""
+            INSERT INTO puntos_acumulados AS a (estudiante_id, valor_id, cantidad)
+            SELECT estudiante_id, valor_id, SUM(cantidad)
+            FROM {particion}
+            WHERE estudiante_id IS NOT NULL AND valor_id IS NOT NULL
+            GROUP BY estudiante_id, valor_id
+            ON CONFLICT (estudiante_id, valor_id) DO UPDATE
+            SET cantidad = a.cantidad + EXCLUDED.cantidad, actualizado_en = now()
+        """)).rowcount
+        conn.execute(text(f"ALTER TABLE puntos DETACH PARTITION {particion}"))
+        conn.execute(text(f"ALTER TABLE {particion} SET SCHEMA {ESQUEMA_ARCHIVO}"))
+        conn.execute(text("UPDATE periodos_puntos SET compactado_en = now() WHERE nombre = :nombre"),
+                     {"nombre": periodo})
+    log(f"✅ {periodo}: {saldos} saldos estudiante × valor; filas en {ESQUEMA_ARCHIVO}.{particion}")
+    return saldos
+
+
+def semestre(fecha: datetime) -> tuple:
+    # (nombre, fin) del semestre que contiene la fecha.
+    if fecha.month < 7:
+        return f"{fecha.year}-1", datetime(fecha.year, 7, 1, tzinfo=timezone.utc)
+    return f"{fecha.year}-2", datetime(fecha.year + 1, 1, 1, tzinfo=timezone.utc)
+
+
+def tramos_faltantes(periodos: list, objetivo: datetime) -> list:
+    # (desde, hasta) sin periodo: huecos entre periodos y lo que falte hasta
+    # el objetivo, partidos por semestre.
+    tramos, fin = [], None
+    for desde, hasta in sorted(periodos):
+        while fin is not None and fin < desde:
+            tramos.append((fin, min(semestre(fin)[1], desde)))
+            fin = tramos[-1][1]
+        fin = hasta if fin is None else max(fin, hasta)
+    while fin is not None and fin < objetivo:
+        tramos.append((fin, semestre(fin)[1]))
+        fin = tramos[-1][1]
+    return tramos
+
+
+def asegurar(engine, anticipacion_dias: int = ANTICIPACION_DIAS, ahora: datetime = None, log=print) -> list:
+    # Sin esto, los puntos de fechas sin periodo caen en la partición por
+    # defecto y cada consulta por fecha la recorre entera.
+    objetivo = (ahora or datetime.now(timezone.utc)) + timedelta(days=anticipacion_dias)
+    with engine.connect() as conn:
+        filas = conn.execute(text("SELECT nombre, desde, hasta FROM periodos_puntos")).fetchall()
+    if not filas:
+        raise ValueError("No hay periodos: falta aplicar la migración 006")
+    nombres = {f.nombre for f in filas}
+    # Los semestres se cortan en UTC.
+    periodos = [(f.desde.astimezone(timezone.utc), f.hasta.astimezone(timezone.utc)) for f in filas]
+
+    creados = []
+    for desde, hasta in tramos_faltantes(periodos, objetivo):
+        nombre = semestre(desde)[0]
+        if nombre in nombres:
+            # Un periodo propio del colegio ya usa el nombre: este es el resto.
+            nombre = f"{nombre}-{desde:%m%d}"
+        crear(engine, nombre, desde, hasta, log=log)
+        nombres.add(nombre)
+        creados.append(nombre)
+    return creados
+
+
+def periodos_cerrados(engine) -> list:
+    with engine.connect() as conn:
+        return [r[0] for r in conn.execute(text("""
+            SELECT nombre FROM periodos_puntos
+            WHERE compactado_en IS NULL AND hasta <= now()
+            ORDER BY desde
+        """))]
+
+
+def estado(engine) -> list:
+    with engine.connect() as conn:
+        return conn.execute(text("""
+            SELECT p.nombre,
+                   CASE WHEN p.desde = '-infinity' THEN '…' ELSE to_char(p.desde, 'YYYY-MM-DD') END AS desde,
+                   to_char(p.hasta, 'YYYY-MM-DD') AS hasta, p.particion, p.compactado_en,
+                   GREATEST(COALESCE(c.reltuples, 0), 0)::bigint AS filas_aprox
+            FROM periodos_puntos p
+            LEFT JOIN pg_class c ON c.relname = p.particion AND c.relkind = 'r'
+            ORDER BY p.desde
+        """)).fetchall()
+
+
+def _fecha(valor: str) -> datetime:
+    fecha = datetime.fromisoformat(valor)
+    return fecha if fecha.tzinfo else fecha.replace(tzinfo=timezone.utc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Periodos y compactación del libro de puntos")
+    parser.add_argument("db_url")
+    sub = parser.add_subparsers(dest="accion", required=True)
+    p_crear = sub.add_parser("crear", help="crea la partición de un periodo")
+    p_crear.add_argument("periodo", help="ej: 2027-1")
+    p_crear.add_argument("desde", type=_fecha, help="inicio (incluido), AAAA-MM-DD")
+    p_crear.add_argument("hasta", type=_fecha, help="fin (excluido), AAAA-MM-DD")
+    p_comp = sub.add_parser("compactar", help="compacta periodos cerrados")
+    p_comp.add_argument("periodo", nargs="?")
+    p_comp.add_argument("--cerrados", action="store_true", help="todos los cerrados sin compactar")
+    p_aseg = sub.add_parser("asegurar", help="crea los semestres que falten para los próximos días")
+    p_aseg.add_argument("--dias", type=int, default=ANTICIPACION_DIAS, help="días a cubrir desde hoy")
+    sub.add_parser("estado", help="lista los periodos")
+    args = parser.parse_args()
+
+    if args.accion == "compactar" and not args.periodo and not args.cerrados:
+        parser.error("indica un periodo o --cerrados")
+
+    engine = create_engine(args.db_url)
+    try:
+        if args.accion == "crear":
+            crear(engine, args.periodo, args.desde, args.hasta)
+        elif args.accion == "asegurar":
+            if not asegurar(engine, args.dias):
+                print("Sin periodos por crear.")
+        elif args.accion == "compactar":
+            for periodo in ([args.periodo] if args.periodo else periodos_cerrados(engine)):
+                compactar(engine, periodo)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    if args.accion == "estado":
+        for p in estado(engine):
+            marca = f"compactado {p.compactado_en:%Y-%m-%d}" if p.compactado_en else f"~{p.filas_aprox} filas"
+            print(f"{p.nombre:<14}{p.desde:>10} → {p.hasta}  {p.particion:<24}{marca}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
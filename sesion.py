@@ -0,0 +1,167 @@
+import hashlib
+import json
+import threading
+import time
+from dataclasses import dataclass
+
+import jwt
+
+# =========================
+# 🔐 Sesiones persistentes
+# =========================
+# Al iniciar sesión, Supabase entrega un access token (JWT firmado, dura ~1 h)
+# y un refresh token. La cookie del navegador lleva solo el access token y
+# vence con él; el refresh token se queda en el servidor (AlmacenRefresco),
+# indexado por el hash del access token. Al recargar la página, la sesión se
+# restaura verificando la firma y la expiración del JWT aquí mismo: sin ir a
+# Supabase.
+#
+# La verificación usa la misma clave con que firma Supabase:
+#   SUPABASE_JWT_SECRET = "..."        (proyectos con secreto compartido, HS256)
+#   SUPABASE_JWKS = '{"keys": [...]}'  (claves asimétricas, contenido de
+#                                       /auth/v1/.well-known/jwks.json)
+# Sin ninguna de las dos, la app no guarda la cookie y pide la contraseña en
+# cada recarga, como antes.
+#
+# El cambio de contraseña vuelve a firmar con la actual en un cliente aparte
+# (ver nuevo_supabase en app.py), así que no depende de los tokens de la
+# cookie ni de acceso al esquema auth.
+#
+# Cuando al token le quedan menos de REFRESCAR_ANTES_S, se renueva en un hilo
+# aparte y la sesión nueva se toma en la siguiente ejecución del script. El
+# almacén vive en la memoria del proceso: si el servidor se reinicia, la
+# sesión restaurada dura lo que le quede al access token.
+
+COOKIE = "horbwartz_sesion"
+AUDIENCIA = "authenticated"
+ALGORITMOS_ASIMETRICOS = ["ES256", "RS256", "EdDSA"]
+HOLGURA_S = 30
+REFRESCAR_ANTES_S = 600
+
+
+@dataclass(frozen=True)
+class Usuario:
+    id: str
+    email: str
+
+
+@dataclass(frozen=True)
+class Sesion:
+    access_token: str
+    refresh_token: str   # None si se restauró sin refresh token en el almacén
+    expira: int
+    usuario: Usuario
+
+    def restante(self, ahora: float = None) -> float:
+        return self.expira - (time.time() if ahora is None else ahora)
+
+    def cookie(self) -> str:
+        # Solo el access token: el refresh token nunca sale del servidor.
+        return self.access_token
+
+
+class AlmacenRefresco:
+    # Refresh tokens por hash del access token que los acompaña. Cada entrada
+    # vence con su access token, igual que la cookie que la referencia.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens = {}
+
+    @staticmethod
+    def _clave(access_token: str) -> str:
+        return hashlib.sha256(access_token.encode()).hexdigest()
+
+    def guardar(self, sesion: Sesion) -> None:
+        ahora = time.time()
+        with self._lock:
+            for clave in [c for c, (_, expira) in self._tokens.items() if expira <= ahora]:
+                del self._tokens[clave]
+            self._tokens[self._clave(sesion.access_token)] = (sesion.refresh_token, sesion.expira)
+
+    def buscar(self, access_token: str):
+        with self._lock:
+            refresh_token, _ = self._tokens.get(self._clave(access_token), (None, 0))
+        return refresh_token
+
+    def olvidar(self, access_token: str) -> None:
+        with self._lock:
+            self._tokens.pop(self._clave(access_token), None)
+
+    def __len__(self):
+        return len(self._tokens)
+
+
+class VerificadorTokens:
+    def __init__(self, secreto: str = None, jwks=None, audiencia: str = AUDIENCIA,
+                 holgura_s: float = HOLGURA_S):
+        if secreto:
+            self._secreto = secreto
+            self._claves = None
+        elif jwks:
+            self._secreto = None
+            datos = json.loads(jwks) if isinstance(jwks, str) else jwks
+            self._claves = jwt.PyJWKSet.from_dict(datos)
+        else:
+            raise ValueError("Se necesita SUPABASE_JWT_SECRET o SUPABASE_JWKS")
+        self.audiencia = audiencia
+        self.holgura_s = holgura_s
+
+    @classmethod
+    def desde_secrets(cls, secrets):
+        secreto = secrets.get("SUPABASE_JWT_SECRET")
+        jwks = secrets.get("SUPABASE_JWKS")
+        if not secreto and not jwks:
+            return None
+        return cls(secreto=secreto, jwks=jwks)
+
+    def _clave(self, token: str):
+        if self._secreto is not None:
+            return self._secreto, ["HS256"]
+        kid = jwt.get_unverified_header(token).get("kid")
+        try:
+            clave = self._claves[kid]
+        except KeyError:
+            raise jwt.InvalidTokenError(f"Clave desconocida: {kid}")
+        return clave.key, ALGORITMOS_ASIMETRICOS
+
+    def verificar(self, token: str, exigir_vigencia: bool = True) -> dict:
+        # Lanza jwt.InvalidTokenError (o ExpiredSignatureError) si no sirve.
+        clave, algoritmos = self._clave(token)
+        return jwt.decode(
+            token, clave, algorithms=algoritmos, audience=self.audiencia,
+            leeway=self.holgura_s,
+            options={"require": ["exp", "sub"], "verify_exp": exigir_vigencia},
+        )
+
+    def sesion(self, access_token: str, refresh_token: str, exigir_vigencia: bool = True) -> Sesion:
+        claims = self.verificar(access_token, exigir_vigencia)
+        return Sesion(
+            access_token=access_token,
+            refresh_token=refresh_token,
+            expira=int(claims["exp"]),
+            usuario=Usuario(id=claims["sub"], email=claims.get("email", "")),
+        )
+
+    def desde_cookie(self, valor: str, almacen: AlmacenRefresco):
+        # None si la cookie no trae un token firmado por Supabase. Un token ya
+        # vencido solo se devuelve si el almacén todavía tiene con qué renovarlo.
+        if not valor:
+            return None
+        try:
+            sesion = self.sesion(valor, almacen.buscar(valor), exigir_vigencia=False)
+        except jwt.InvalidTokenError:
+            return None
+        if sesion.refresh_token is None and sesion.restante() <= 0:
+            return None
+        return sesion
+
+
+def refrescar(cliente, refresh_token: str, verificador: VerificadorTokens) -> Sesion:
+    # Única llamada de red del ciclo: cambia el refresh token por un par nuevo.
+    if refresh_token is None:
+        raise jwt.InvalidTokenError("La sesión no tiene refresh token en este servidor")
+    resp = cliente.auth.refresh_session(refresh_token)
+    if resp.session is None:
+        raise jwt.InvalidTokenError("Supabase no renovó la sesión")
+    return verificador.sesion(resp.session.access_token, resp.session.refresh_token)
+
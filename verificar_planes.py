@@ -0,0 +1,239 @@
+import argparse
+import ast
+import itertools
+import json
+import re
+import sys
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+
+import migrar
+
+# =========================
+# 🔍 Regresión de planes de consulta
+# =========================
+# Extrae del código todas las consultas text("...") que emiten las apps, las
+# corre con EXPLAIN contra una base Postgres local sembrada y falla si alguna
+# hace Seq Scan sobre el libro de puntos, o si una consulta paginada por
+# keyset deja de leer en orden desde su índice (ver ORDENADAS).
+#
+#   python verificar_planes.py postgresql://postgres@localhost:5432/hogwarts_planes --sembrar
+#
+# --sembrar aplica las migraciones y carga datos sintéticos (solo si la base
+# está vacía). Usa siempre una base desechable, nunca la de producción.
+
+RAIZ = Path(__file__).resolve().parent
+ARCHIVOS = ["app.py", "hogwarts_estudiantes.py", "onboarding.py", "boletines.py", "notificaciones.py"]
+
+# Tablas del libro de puntos (incluye particiones puntos_*).
+LIBRO = re.compile(r"^puntos(_.+)?$")
+
+# Consultas paginadas por keyset: las que contienen el ORDER BY deben leer la
+# tabla solo con un Index Scan del índice indicado y cortar en un Limit justo
+# encima; un Sort o un Bitmap Scan querría decir que ordenan el grado entero.
+# Se planifican sin los filtros opcionales, que es la página que más lee (con
+# filtros, el planificador puede preferir un índice más angosto).
+ORDENADAS = {
+    "ORDER BY COALESCE(apellidos, ''), COALESCE(nombre, ''), id":
+        ("estudiantes", "estudiantes_seccion_orden_idx", {"frat": None, "patron": None}),
+}
+
+# Las consultas armadas con f-strings se expanden con todas sus variantes.
+VARIANTES = {
+    "filtro": ["p.estudiante_id", "p.profesor_id"],
+    "condicion_cursor": ["", "AND (p.created_at, p.id) < (:cur_ts, :cur_id)"],
+}
+
+
+def consultas_de(archivo: str):
+    arbol = ast.parse((RAIZ / archivo).read_text(encoding="utf-8"))
+    for nodo in ast.walk(arbol):
+        if not (isinstance(nodo, ast.Call) and nodo.args):
+            continue
+        nombre = nodo.func.id if isinstance(nodo.func, ast.Name) else getattr(nodo.func, "attr", None)
+        if nombre != "text":
+            continue
+        arg = nodo.args[0]
+        if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+            yield f"{archivo}:{nodo.lineno}", arg.value
+        elif isinstance(arg, ast.JoinedStr):
+            yield from _expandir(f"{archivo}:{nodo.lineno}", arg)
+
+
+def _expandir(origen: str, arg: ast.JoinedStr):
+    partes = []
+    for valor in arg.values:
+        if isinstance(valor, ast.Constant):
+            partes.append([valor.value])
+        elif isinstance(valor.value, ast.Name) and valor.value.id in VARIANTES:
+            partes.append(VARIANTES[valor.value.id])
+        else:
+            raise ValueError(f"{origen}: f-string sin variantes conocidas ({ast.unparse(valor)})")
+    for i, combinacion in enumerate(itertools.product(*partes)):
+        yield f"{origen}#{i}", "".join(combinacion)
+
+
+def sembrar(engine, colegios: int, estudiantes: int, puntos: int):
+    with engine.begin() as conn:
+        if conn.execute(text("SELECT count(*) FROM colegios")).scalar():
+            print("ℹ️ La base ya tiene datos; no se siembra.")
+            return
+        conn.execute(text("""
+            INSERT INTO colegios (nombre) SELECT 'Colegio ' || g FROM generate_series(1, :n) g
+        """), {"n": colegios})
+        conn.execute(text("""
+            INSERT INTO fraternidades (nombre, colegio_id)
+            SELECT f, c.id FROM colegios c,
+                   unnest(ARRAY['Gryffindor', 'Hufflepuff', 'Ravenclaw', 'Slytherin']) f
+        """))
+        conn.execute(text("""
+            INSERT INTO valores (nombre, colegio_id)
+            SELECT v, c.id FROM colegios c,
+                   unnest(ARRAY['Marca LCB', 'Respeto', 'Solidaridad', 'Honestidad', 'Gratitud', 'Corresponsabilidad']) v
+        """))
+        conn.execute(text("""
+            INSERT INTO estudiantes (codigo, nombre, apellidos, grado, fraternidad_id, colegio_id)
+            SELECT 'E' || c.n || '-' || g, 'Nombre' || g, 'Apellido' || g,
+                   (6 + g % 6) || chr(65 + g % 3),
+                   (SELECT f.id FROM fraternidades f WHERE f.colegio_id = c.id ORDER BY f.nombre OFFSET g % 4 LIMIT 1),
+                   c.id
+            FROM (SELECT id, row_number() OVER (ORDER BY nombre) AS n FROM colegios) c,
+                 generate_series(1, :n) g
+        """), {"n": estudiantes})
+        conn.execute(text("""
+            INSERT INTO profesores (email, cedula, nombres, apellidos, rol, colegio_id)
+            SELECT 'profe' || g || '@' || c.id, 'C' || c.id || g, 'Profe', g::text,
+                   CASE WHEN g = 1 THEN 'director' ELSE 'profesor' END, c.id
+            FROM colegios c, generate_series(1, 20) g
+        """))
+        conn.execute(text("""
+            WITH e AS (SELECT id, colegio_id, row_number() OVER () AS n FROM estudiantes),
+                 v AS (SELECT id, colegio_id, row_number() OVER (PARTITION BY colegio_id) AS n FROM valores),
+                 p AS (SELECT id, colegio_id, row_number() OVER (PARTITION BY colegio_id) AS n FROM profesores),
+                 total AS (SELECT count(*) AS n FROM estudiantes)
+            INSERT INTO puntos (estudiante_id, valor_id, cantidad, profesor_id, created_at)
+            SELECT e.id, v.id, 1 + g % 5, p.id, now() - (g % 365) * interval '1 day'
+            FROM generate_series(1, :n) g
+            CROSS JOIN total
+            JOIN e ON e.n = 1 + (g::bigint * 7919) % total.n
+            JOIN v ON v.colegio_id = e.colegio_id AND v.n = 1 + g % 6
+            JOIN p ON p.colegio_id = e.colegio_id AND p.n = 1 + g % 20
+        """), {"n": puntos})
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").exec_driver_sql("ANALYZE")
+    print(f"🌱 Sembrados {colegios} colegios, {colegios * estudiantes} estudiantes y {puntos} puntos.")
+
+
+def parametros_de_muestra(engine) -> dict:
+    with engine.connect() as conn:
+        fila = conn.execute(text("""
+            SELECT e.colegio_id, e.id AS estudiante_id, e.codigo, e.grado,
+                   f.id AS fraternidad_id, f.nombre AS fraternidad,
+                   v.id AS valor_id, v.nombre AS valor,
+                   p.id AS profesor_id, p.email, p.cedula
+            FROM estudiantes e
+            JOIN fraternidades f ON f.id = e.fraternidad_id
+            JOIN valores v ON v.colegio_id = e.colegio_id
+            JOIN profesores p ON p.colegio_id = e.colegio_id
+            LIMIT 1
+        """)).mappings().one()
+    return {
+        "cid": str(fila["colegio_id"]), "colegio": str(fila["colegio_id"]),
+        "id": str(fila["estudiante_id"]), "estudiante_id": str(fila["estudiante_id"]),
+        "eid": str(fila["estudiante_id"]), "ref": str(fila["estudiante_id"]),
+        "fid": str(fila["fraternidad_id"]), "frat": str(fila["fraternidad_id"]),
+        "fname": fila["fraternidad"], "valor": fila["valor"], "valor_id": str(fila["valor_id"]),
+        "profesor_id": str(fila["profesor_id"]), "email": fila["email"],
+        "ced": fila["cedula"], "cedula": fila["cedula"], "codigo": fila["codigo"], "grado": fila["grado"],
+        "semanas": 12, "lim": 21, "cantidad": 1,
+        "cur_ts": "2100-01-01T00:00:00+00:00", "cur_id": "00000000-0000-0000-0000-000000000000",
+        "cur_ape": "", "cur_nom": "", "grados": [fila["grado"]], "patron": "%a%",
+        "ids": [str(fila["estudiante_id"])],
+    }
+
+
+def recorrer(plan: dict, padre: dict = None):
+    yield plan, padre
+    for hijo in plan.get("Plans", []):
+        yield from recorrer(hijo, plan)
+
+
+def plan_de(conn, sql: str, muestra: dict) -> dict:
+    consulta = text(sql)
+    params = {k: muestra.get(k) for k in consulta.compile().params}
+    # EXPLAIN sin ANALYZE: planifica INSERT/UPDATE sin ejecutarlos.
+    plan = conn.execute(text("EXPLAIN (FORMAT JSON) " + sql), params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+def vacias(conn, tablas: set) -> set:
+    # Una partición sin páginas (el semestre que aún no empieza, la de por
+    # defecto) se recorre gratis: el planificador cambia a índices cuando tenga filas.
+    if not tablas:
+        return set()
+    return {r[0] for r in conn.execute(text(
+        "SELECT relname FROM pg_class WHERE relname = ANY(:tablas) AND relpages = 0"), {"tablas": list(tablas)})}
+
+
+def problemas_del_plan(conn, sql: str, muestra: dict) -> list:
+    tablas = {n["Relation Name"] for n, _ in recorrer(plan_de(conn, sql, muestra))
+              if n["Node Type"] == "Seq Scan" and LIBRO.match(n.get("Relation Name", ""))}
+    problemas = sorted(f"Seq Scan {t}" for t in tablas - vacias(conn, tablas))
+    plano = " ".join(sql.split())
+    for orden, (tabla, indice, sin_filtros) in ORDENADAS.items():
+        if orden not in plano:
+            continue
+        for nodo, padre in recorrer(plan_de(conn, sql, {**muestra, **sin_filtros})):
+            if nodo.get("Relation Name") != tabla:
+                continue
+            if nodo["Node Type"] != "Index Scan" or nodo.get("Index Name") != indice:
+                problemas.append(f"{nodo['Node Type']} {tabla} sin {indice}")
+            elif padre is None or padre["Node Type"] != "Limit":
+                problemas.append(f"{tabla} sin Limit sobre {indice}")
+    return problemas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica que ninguna consulta recorra todo el libro de puntos "
+                                                 "y que las paginadas usen su índice")
+    parser.add_argument("db_url", help="base Postgres local y desechable")
+    parser.add_argument("--sembrar", action="store_true", help="aplica migraciones y siembra datos si está vacía")
+    parser.add_argument("--colegios", type=int, default=20)
+    parser.add_argument("--estudiantes", type=int, default=600, help="estudiantes por colegio")
+    parser.add_argument("--puntos", type=int, default=300_000)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    engine = create_engine(args.db_url)
+    if args.sembrar:
+        migrar.aplicar(engine)
+        sembrar(engine, args.colegios, args.estudiantes, args.puntos)
+
+    muestra = parametros_de_muestra(engine)
+    fallas, revisadas = [], 0
+    with engine.connect() as conn:
+        for archivo in ARCHIVOS:
+            for origen, sql in consultas_de(archivo):
+                revisadas += 1
+                problemas = problemas_del_plan(conn, sql, muestra)
+                if problemas:
+                    fallas.append((origen, problemas, " ".join(sql.split())))
+                elif args.verbose:
+                    print(f"✅ {origen}")
+        conn.rollback()
+
+    if fallas:
+        print(f"❌ {len(fallas)} de {revisadas} consultas tienen planes que recorren de más:")
+        for origen, problemas, sql in fallas:
+            print(f"  - {origen} ({', '.join(problemas)}): {sql[:160]}")
+        return 1
+    print(f"✅ {revisadas} consultas revisadas; ninguna recorre el libro de puntos y "
+          f"las paginadas leen en orden desde su índice.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+import argparse
+import json
+import secrets
+import sys
+import time
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from sesion import AlmacenRefresco, Sesion, Usuario, VerificadorTokens
+
+# =========================
+# 🔐 Verificación local de sesiones
+# =========================
+# Genera claves de firma locales (un secreto HS256 y un par ES256 publicado
+# como JWKS), firma tokens con la forma de los de Supabase y comprueba que
+# sesion.VerificadorTokens acepte solo los que debe y que los refresh tokens
+# se queden en sesion.AlmacenRefresco. No usa red ni base.
+#
+#   python verificar_sesion.py
+
+
+def firmar(clave, algoritmo="HS256", kid=None, vence_en=3600, **cambios) -> str:
+    claims = {"sub": "00000000-0000-0000-0000-000000000001", "email": "profe@colegio.edu",
+              "aud": "authenticated", "role": "authenticated", "exp": int(time.time() + vence_en)}
+    claims.update(cambios)
+    return jwt.encode(claims, clave, algorithm=algoritmo, headers={"kid": kid} if kid else None)
+
+
+def sin_firma() -> str:
+    # alg=none armado a mano: PyJWT no deja firmarlo así.
+    cabecera = jwt.utils.base64url_encode(json.dumps({"alg": "none", "typ": "JWT"}).encode()).decode()
+    cuerpo = jwt.utils.base64url_encode(json.dumps({
+        "sub": "x", "aud": "authenticated", "exp": int(time.time() + 3600)}).encode()).decode()
+    return f"{cabecera}.{cuerpo}."
+
+
+def casos():
+    secreto = secrets.token_urlsafe(32)
+    hs = VerificadorTokens(secreto=secreto)
+
+    privada = ec.generate_private_key(ec.SECP256R1())
+    publica = json.loads(jwt.algorithms.ECAlgorithm.to_jwk(privada.public_key()))
+    publica.update(kid="local-1", alg="ES256", use="sig")
+    es = VerificadorTokens(jwks=json.dumps({"keys": [publica]}))
+    otra = ec.generate_private_key(ec.SECP256R1())
+
+    almacen = AlmacenRefresco()
+
+    def restaura(verificador, token):
+        # Como tras un inicio de sesión: el refresh token queda en el servidor.
+        expira = jwt.decode(token, options={"verify_signature": False}).get("exp", 0)
+        almacen.guardar(Sesion(token, "refresh-local", expira, Usuario("x", "")))
+        return verificador.desde_cookie(token, almacen)
+
+    vigente = restaura(hs, firmar(secreto))
+    yield "HS256 vigente se restaura", vigente is not None and vigente.restante() > 3500
+    yield "HS256 conserva usuario", vigente is not None and vigente.usuario.email == "profe@colegio.edu"
+    yield "refresh token sale del almacén", vigente is not None and vigente.refresh_token == "refresh-local"
+    yield "la cookie solo lleva el access token", vigente is not None and vigente.cookie() == vigente.access_token
+    yield "HS256 firma inválida", restaura(hs, firmar(secrets.token_urlsafe(32))) is None
+    vencida = restaura(hs, firmar(secreto, vence_en=-600))
+    yield "HS256 vencido se restaura para refrescar", vencida is not None and vencida.restante() < 0
+    sin_almacen = hs.desde_cookie(firmar(secreto), AlmacenRefresco())
+    yield "sin entrada en el almacén se restaura sin refresh token", (
+        sin_almacen is not None and sin_almacen.refresh_token is None)
+    yield "vencido sin refresh token no se restaura", (
+        hs.desde_cookie(firmar(secreto, vence_en=-600), AlmacenRefresco()) is None)
+    try:
+        hs.verificar(firmar(secreto, vence_en=-600))
+        yield "HS256 vencido rechazado al exigir vigencia", False
+    except jwt.ExpiredSignatureError:
+        yield "HS256 vencido rechazado al exigir vigencia", True
+    yield "HS256 audiencia equivocada", restaura(hs, firmar(secreto, aud="anon")) is None
+    yield "HS256 sin exp", restaura(hs, jwt.encode({"sub": "x", "aud": "authenticated"}, secreto)) is None
+    yield "alg=none", restaura(hs, sin_firma()) is None and restaura(es, sin_firma()) is None
+    yield "cookie vacía", hs.desde_cookie(None, almacen) is None and hs.desde_cookie("", almacen) is None
+    yield "cookie antigua con refresh token", hs.desde_cookie(f"{firmar(secreto)}|refresh-local", almacen) is None
+
+    yield "ES256 vigente se restaura", restaura(es, firmar(privada, "ES256", "local-1")) is not None
+    yield "ES256 firma inválida", restaura(es, firmar(otra, "ES256", "local-1")) is None
+    vencida = restaura(es, firmar(privada, "ES256", "local-1", vence_en=-600))
+    yield "ES256 vencido se restaura para refrescar", vencida is not None and vencida.restante() < 0
+    yield "ES256 audiencia equivocada", restaura(es, firmar(privada, "ES256", "local-1", aud="anon")) is None
+    yield "ES256 kid desconocido", restaura(es, firmar(privada, "ES256", "local-2")) is None
+    yield "HS256 contra JWKS", restaura(es, firmar(secreto)) is None
+
+    yield "sin secrets no hay verificador", VerificadorTokens.desde_secrets({}) is None
+
+    purga = AlmacenRefresco()
+    vieja = Sesion("viejo", "r-viejo", int(time.time() - 1), Usuario("x", ""))
+    purga.guardar(vieja)
+    purga.guardar(Sesion("nuevo", "r-nuevo", int(time.time() + 3600), Usuario("x", "")))
+    yield "el almacén descarta entradas vencidas", purga.buscar("viejo") is None and len(purga) == 1
+    purga.olvidar("nuevo")
+    yield "cerrar sesión olvida el refresh token", purga.buscar("nuevo") is None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica la validación local de tokens de sesión")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    fallas, revisados = [], 0
+    for nombre, ok in casos():
+        revisados += 1
+        if not ok:
+            fallas.append(nombre)
+        elif args.verbose:
+            print(f"✅ {nombre}")
+
+    if fallas:
+        print(f"❌ {len(fallas)} de {revisados} casos fallaron:")
+        for nombre in fallas:
+            print(f"  - {nombre}")
+        return 1
+    print(f"✅ {revisados} casos de sesión verificados con claves locales.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())